@@ -0,0 +1,46 @@
+"""
+Batched drawing helpers for the Module 1 diagram generators
+Geometry for rings of pores, spirals of chromatin, wavy membranes and
+filaments is computed over NumPy arrays in one step, and the results are
+drawn with as few calls as possible: one line() per polyline and one
+stamp() per set of identical ellipses.
+"""
+
+import numpy as np
+
+def polar_points(cx, cy, radius, angle, squash=1.0):
+    """Integer points cx + int(r cos a), cy + int(r * squash * sin a).
+
+    radius and angle (degrees) broadcast against each other; the truncation
+    matches int() on the per-point float, so results equal the scalar loops.
+    """
+    radius = np.asarray(radius, dtype=float)
+    angle = np.radians(np.asarray(angle, dtype=float))
+    xs = cx + np.trunc(radius * np.cos(angle)).astype(int)
+    ys = cy + np.trunc(radius * squash * np.sin(angle)).astype(int)
+    return np.broadcast_arrays(xs, ys)
+
+def wave(xs, baseline, amplitude, frequency, phase=0.0):
+    """Integer y = baseline + int(amplitude * sin(x * frequency + phase)) for every x"""
+    xs = np.asarray(xs, dtype=float)
+    return baseline + np.trunc(amplitude * np.sin(xs * frequency + phase)).astype(int)
+
+def as_points(xs, ys):
+    """Coordinate arrays -> [(x, y), ...] of plain Python numbers for ImageDraw"""
+    return list(zip(np.ravel(xs).tolist(), np.ravel(ys).tolist()))
+
+def polyline(draw, xs, ys, fill=None, width=1):
+    """Draw the whole polyline through xs, ys with a single line() call"""
+    draw.line(as_points(xs, ys), fill=fill, width=width)
+
+def segments(draw, x1, y1, x2, y2, fill=None, width=1):
+    """Draw disjoint segments (x1, y1)-(x2, y2); Pillow needs a call per segment"""
+    for start, end in zip(as_points(x1, y1), as_points(x2, y2)):
+        draw.line([start, end], fill=fill, width=width)
+
+def ellipses(draw, xs, ys, radius, fill=None, outline=None, width=None):
+    """Draw one ellipse of radius r or (rx, ry) centred on every point"""
+    kwargs = {'fill': fill, 'outline': outline}
+    if width is not None:
+        kwargs['width'] = width
+    draw.stamp('ellipse', np.ravel(xs), np.ravel(ys), radius, **kwargs)
@@ -0,0 +1,107 @@
+"""
+Render benchmark for the Module 1 diagram generator
+Times the draw, encode and thumbnail stages of every job over N repetitions,
+records peak memory and encoded bytes, and diffs the results against a saved
+JSON baseline so slowdowns and size regressions fail the run.
+"""
+
+import json
+import os
+import platform
+import statistics
+import time
+import tracemalloc
+
+import PIL
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+STAGES = ('draw', 'encode', 'thumbnail')
+
+# Differences below these are treated as noise rather than regressions
+MIN_TIME_DELTA = 0.005
+MIN_SIZE_DELTA = 256
+
+def peak_rss_kb():
+    """Peak resident set size of this process so far, in KB (None if unknown)"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS reports bytes, Linux kilobytes
+    return peak // 1024 if platform.system() == 'Darwin' else peak
+
+def bench_one(job, run_once, reps):
+    """Run one job reps times; run_once(job) returns ({stage: seconds}, bytes)"""
+    samples = {stage: [] for stage in STAGES}
+    output_bytes = None
+    tracemalloc.start()
+    try:
+        for _ in range(reps):
+            timings, output_bytes = run_once(job)
+            for stage in STAGES:
+                samples[stage].append(timings.get(stage, 0.0))
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        'stages': {stage: {'median': statistics.median(values), 'min': min(values)}
+                   for stage, values in samples.items()},
+        'total': statistics.median(sum(run) for run in zip(*samples.values())),
+        'peak_traced_kb': peak // 1024,
+        'bytes': output_bytes,
+    }
+
+def run_benchmark(jobs, run_once, reps):
+    """Benchmark every job in-process and serially, printing a line per job"""
+    results = {}
+    start = time.perf_counter()
+    for job in jobs:
+        result = bench_one(job, run_once, reps)
+        results[job.name] = result
+        stages = '  '.join(f"{stage} {result['stages'][stage]['median'] * 1000:7.1f}ms"
+                           for stage in STAGES)
+        print(f"  {job.name:<40} {stages}  {result['bytes'] / 1024:7.1f} KB"
+              f"  peak {result['peak_traced_kb']} KB")
+    return {
+        'pillow': PIL.__version__,
+        'python': platform.python_version(),
+        'reps': reps,
+        'elapsed': time.perf_counter() - start,
+        'peak_rss_kb': peak_rss_kb(),
+        'jobs': results,
+    }
+
+def save_results(path, results):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+def load_results(path):
+    with open(path) as f:
+        return json.load(f)
+
+def compare(baseline, current, time_threshold, size_threshold):
+    """Regressions of current against baseline, as human-readable strings.
+
+    A job regresses when its median total time grows by more than
+    time_threshold (a fraction) or its encoded bytes by more than
+    size_threshold, ignoring changes below the noise floor.
+    """
+    regressions = []
+    for name, now in current['jobs'].items():
+        before = baseline['jobs'].get(name)
+        if before is None:
+            continue
+        old_time, new_time = before['total'], now['total']
+        if new_time - old_time > MIN_TIME_DELTA and new_time > old_time * (1 + time_threshold):
+            regressions.append(f"{name}: {old_time * 1000:.1f}ms -> {new_time * 1000:.1f}ms "
+                               f"(+{(new_time / old_time - 1) * 100:.0f}%)")
+        old_size, new_size = before['bytes'], now['bytes']
+        if new_size - old_size > MIN_SIZE_DELTA and new_size > old_size * (1 + size_threshold):
+            regressions.append(f"{name}: {old_size} -> {new_size} bytes "
+                               f"(+{(new_size / old_size - 1) * 100:.0f}%)")
+    return regressions
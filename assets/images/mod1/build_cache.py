@@ -0,0 +1,108 @@
+"""
+Content-hash build cache for the Module 1 diagram generator
+Keeps a JSON manifest next to the image set so unchanged diagrams and
+thumbnails are never re-rendered or re-encoded.
+"""
+
+import hashlib
+import inspect
+import json
+import os
+import types
+
+import PIL
+
+MANIFEST_NAME = '.build-cache.json'
+
+# Bump to invalidate every cached entry after a change to the engine itself
+CACHE_VERSION = 1
+
+def _local_sources(func, seen):
+    """Yield the source of func and of every helper it references that lives
+    in the same directory (module-level functions and sibling modules)"""
+    if func in seen:
+        return
+    seen.add(func)
+    yield inspect.getsource(func)
+
+    home = os.path.dirname(os.path.abspath(inspect.getfile(func)))
+    names = set()
+    codes = [func.__code__]
+    while codes:
+        code = codes.pop()
+        names.update(code.co_names)
+        codes.extend(c for c in code.co_consts if isinstance(c, types.CodeType))
+
+    for name in sorted(names):
+        obj = func.__globals__.get(name)
+        if isinstance(obj, types.FunctionType):
+            if os.path.dirname(os.path.abspath(inspect.getfile(obj))) == home:
+                yield from _local_sources(obj, seen)
+        elif isinstance(obj, types.ModuleType) and obj not in seen:
+            path = getattr(obj, '__file__', None)
+            if path and os.path.dirname(os.path.abspath(path)) == home:
+                seen.add(obj)
+                yield inspect.getsource(obj)
+
+def function_fingerprint(func):
+    """Hash of a generator's source plus the local helpers it calls"""
+    digest = hashlib.sha256()
+    for source in _local_sources(func, set()):
+        digest.update(source.encode('utf-8'))
+    return digest.hexdigest()
+
+def module_fingerprint(*modules):
+    """Hash of the source of whole modules, e.g. shared rendering engine code"""
+    digest = hashlib.sha256()
+    for module in modules:
+        digest.update(inspect.getsource(module).encode('utf-8'))
+    return digest.hexdigest()
+
+def make_key(*parts):
+    """Combine fingerprint, parameters and settings into one cache key"""
+    payload = json.dumps([CACHE_VERSION, PIL.__version__, *parts], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def file_digest(path):
+    """SHA-256 of a file's bytes"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 16), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class BuildCache:
+    """Manifest mapping output paths (relative to base_path) to cache keys.
+
+    mirrors are extra output roots that must also hold a copy for an entry
+    to count as fresh.
+    """
+
+    def __init__(self, base_path, enabled=True, mirrors=()):
+        self.base_path = base_path
+        self.roots = [base_path, *mirrors]
+        self.path = os.path.join(base_path, MANIFEST_NAME)
+        self.enabled = enabled
+        self.entries = {}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path) as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError):
+                self.entries = {}
+
+    def is_fresh(self, output, key):
+        """True when output was built from key and is still on disk"""
+        return (self.enabled and self.entries.get(output) == key
+                and all(os.path.exists(os.path.join(root, output)) for root in self.roots))
+
+    def record(self, output, key):
+        self.entries[output] = key
+
+    def save(self):
+        os.makedirs(self.base_path, exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.entries, f, indent=2, sort_keys=True)
+            f.write('\n')
+        os.replace(tmp_path, self.path)
@@ -2,14 +2,51 @@
 """
 Generate educational diagrams for HSC Biology Module 1 Lessons 1-3
 Output: WebP format, optimized for web (<100KB per image)
+Simple diagrams are declared as JSON specs under specs/ (see diagram_specs.py)
 """
 
-from PIL import Image, ImageDraw, ImageFont
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import hashlib
+import inspect
 import os
+import posixpath
 import math
+import sys
+import time
+import traceback
 
-def ensure_dir(path):
-    os.makedirs(os.path.dirname(path), exist_ok=True)
+import numpy as np
+
+import batch
+import benchmark
+import display_list
+import encoding
+import fonts
+import label_layout
+import layers
+import palette
+import registry
+import server
+import stamps
+import svg_backend
+import textures
+import themes
+import watch
+import worker
+from build_cache import BuildCache, file_digest, function_fingerprint, make_key, module_fingerprint
+from encoding import (DEFAULT_BUDGET, DEFAULT_MIN_PSNR, INDEXED_FORMATS, MIME_TYPES, THUMBNAIL_ENCODE, THUMBNAIL_SIZE,
+                      available_fallbacks, update_sidecars, variant_path, write_variants)
+from diagram_specs import SPEC_DIR, SpecError, discover_specs, draw_spec_file, load_spec
+from display_list import capture
+from layers import BASE_CACHE
+from manifest import MANIFEST_NAME, write_manifest
+from registry import DEFAULT_BACKGROUND, DEFAULT_ENCODE, LINE_ART, REGISTRY, diagram, job, select
+from svg_backend import render_svg
+
+# Default output root: the directory holding this script
+BASE_PATH = os.path.dirname(os.path.abspath(__file__))
 
 def draw_rounded_rect(draw, xy, radius, fill, outline=None, width=1):
     """Draw a rounded rectangle"""
@@ -23,10 +60,10 @@ def draw_rounded_rect(draw, xy, radius, fill, outline=None, width=1):
     draw.ellipse([x1, y2-radius*2, x1+radius*2, y2], fill=fill)
     draw.ellipse([x2-radius*2, y2-radius*2, x2, y2], fill=fill)
 
-def create_prokaryote_diagram():
+@diagram(1, 'prokaryote-diagram', (800, 600), encode={**DEFAULT_ENCODE, 'method': 6},
+         tags=('diagram', LINE_ART))
+def create_prokaryote_diagram(draw):
     """Lesson 1: Prokaryotic cell diagram (800x600)"""
-    img = Image.new('RGB', (800, 600), '#f8fafc')
-    draw = ImageDraw.Draw(img)
     
     # Draw cell outline (bacillus/rod shape)
     cx, cy = 400, 300
@@ -63,8 +100,8 @@ def create_prokaryote_diagram():
         (cx+80, cy+40), (cx+150, cy+20), (cx+130, cy+50),
         (cx-150, cy-60), (cx-120, cy+30), (cx-100, cy+50)
     ]
-    for x, y in ribosome_positions:
-        draw.ellipse([x-6, y-6, x+6, y+6], fill='#10b981', outline='#059669')
+    xs, ys = zip(*ribosome_positions)
+    draw.stamp('ellipse', xs, ys, 6, fill='#10b981', outline='#059669')
     
     # Plasmid (small circular DNA)
     draw.ellipse([cx+50, cy-80, cx+90, cy-40], outline='#ec4899', width=3)
@@ -86,104 +123,46 @@ def create_prokaryote_diagram():
         y2 = flag_y + 15 if i % 2 == 0 else flag_y - 15
         draw.line([(x, flag_y if i == 0 else y1), (x+25, y2)], fill='#64748b', width=6)
     
-    # Labels with leader lines
+    # Labels (placed by label_layout, with leader lines)
     label_color = '#1e293b'
     
-    # Nucleoid label
-    draw.line([(cx-30, cy), (cx-120, cy-80)], fill=label_color, width=2)
-    draw.text((cx-220, cy-95), "Nucleoid", fill=label_color, font=None)
-    draw.text((cx-220, cy-75), "(circular DNA)", fill='#64748b', font=None)
-    
-    # 70S Ribosomes label
-    draw.line([(cx+130, cy-40), (cx+200, cy-100)], fill=label_color, width=2)
-    draw.text((cx+210, cy-115), "70S Ribosomes", fill=label_color, font=None)
-    
-    # Peptidoglycan label
-    draw.line([(cx-cell_w//2, cy-cell_h//2-10), (cx-cell_w//2-50, cy-cell_h//2-60)], fill=label_color, width=2)
-    draw.text((cx-cell_w//2-180, cy-cell_h//2-80), "Peptidoglycan", fill=label_color, font=None)
-    draw.text((cx-cell_w//2-180, cy-cell_h//2-60), "Cell Wall", fill='#64748b', font=None)
-    
-    # Flagellum label
-    draw.line([(flag_x+100, flag_y), (flag_x+150, flag_y-40)], fill=label_color, width=2)
-    draw.text((flag_x+160, flag_y-60), "Flagellum", fill=label_color, font=None)
+    draw.label((cx-30, cy), "Nucleoid", near=(cx-220, cy-95), fill=label_color, note="(circular DNA)")
+    draw.label((cx+140, cy-60), "70S Ribosomes", near=(cx+210, cy-115), fill=label_color)
+    draw.label((cx-cell_w//2-4, cy-40), "Peptidoglycan", near=(cx-cell_w//2-180, cy-cell_h//2-80),
+               fill=label_color, note="Cell Wall")
+    draw.label((flag_x+100, flag_y), "Flagellum", near=(flag_x+160, flag_y-60), fill=label_color)
     
     # Title
-    draw.text((cx-150, 30), "Prokaryotic Cell Structure", fill='#1e3a5f', font=None)
-    draw.text((cx-80, 55), "(Bacillus form)", fill='#64748b', font=None)
-    
-    ensure_dir('/workspaces/Learn/assets/images/mod1/lesson01/prokaryote-diagram.webp')
-    img.save('/workspaces/Learn/assets/images/mod1/lesson01/prokaryote-diagram.webp', 'WEBP', quality=85, method=6)
-    return img
+    draw.text((cx-150, 30), "Prokaryotic Cell Structure", fill='#1e3a5f', style='title')
+    draw.text((cx-80, 55), "(Bacillus form)", fill='#64748b', style='caption')
 
-def create_nucleoid_tem():
+@diagram(1, 'nucleoid-tem', (400, 300), '#1a1a2e', tags=('micrograph', 'tem'))
+def create_nucleoid_tem(draw, rng):
     """Lesson 1: TEM of nucleoid region (400x300)"""
-    img = Image.new('RGB', (400, 300), '#1a1a2e')
-    draw = ImageDraw.Draw(img)
     
     # Simulated TEM appearance (dark field with lighter structures)
     # Background grain
-    for i in range(200):
-        x, y = (i * 7) % 400, (i * 13) % 300
-        draw.point((x, y), fill='#252542')
+    draw.layer(textures.paint_dots, *textures.lattice_grain(200, 7, 13, 400, 300), '#252542')
     
     # Nucleoid region (lighter fibrillar area)
     cx, cy = 200, 150
-    for i in range(30):
-        angle = i * 12
-        for r in range(20, 80, 3):
-            x = cx + int(r * math.cos(math.radians(angle + r)))
-            y = cy + int(r * 0.6 * math.sin(math.radians(angle + r * 2)))
-            if 0 <= x < 400 and 0 <= y < 300:
-                draw.ellipse([x-2, y-2, x+2, y+2], fill='#6b7280')
+    xs, ys = textures.fibril_coords(cx, cy, arms=30, radii=range(20, 80, 3))
+    draw.layer(textures.paint_dots, xs, ys, '#6b7280', radius=2)
     
     # Ribosomes (small dark dots)
-    for _ in range(50):
-        import random
-        x = random.randint(50, 350)
-        y = random.randint(50, 250)
-        if ((x-cx)**2/10000 + (y-cy)**2/3600) > 1:  # Outside nucleoid
-            draw.ellipse([x-2, y-2, x+2, y+2], fill='#374151')
+    xs, ys = textures.speckle_coords(rng, 50, (50, 350), (50, 250))
+    outside = ((xs-cx)**2/10000 + (ys-cy)**2/3600) > 1  # Outside nucleoid
+    draw.layer(textures.paint_dots, xs[outside], ys[outside], '#374151', radius=2)
     
     # Scale bar
     draw.rectangle([280, 270, 360, 278], fill='white')
-    draw.text((285, 280), "0.5 µm", fill='white', font=None)
-    
-    draw.text((10, 10), "TEM: Nucleoid Region", fill='white', font=None)
-    
-    ensure_dir('/workspaces/Learn/assets/images/mod1/lesson01/nucleoid-tem.webp')
-    img.save('/workspaces/Learn/assets/images/mod1/lesson01/nucleoid-tem.webp', 'WEBP', quality=85)
-    return img
-
-def create_70s_ribosome():
-    """Lesson 1: 70S ribosome diagram (300x300)"""
-    img = Image.new('RGB', (300, 300), '#f8fafc')
-    draw = ImageDraw.Draw(img)
+    draw.text((285, 280), "0.5 µm", fill='white', style='scale-bar')
     
-    cx, cy = 150, 150
-    
-    # 50S Large subunit (top)
-    draw.pieslice([cx-70, cy-90, cx+70, cy+20], start=0, end=180, fill='#3b82f6', outline='#1d4ed8', width=3)
-    draw.text((cx-20, cy-60), "50S", fill='white', font=None)
-    
-    # 30S Small subunit (bottom)
-    draw.pieslice([cx-45, cy-10, cx+45, cy+80], start=180, end=360, fill='#10b981', outline='#059669', width=3)
-    draw.text((cx-15, cy+30), "30S", fill='white', font=None)
-    
-    # mRNA channel
-    draw.rectangle([cx-80, cy-5, cx+80, cy+5], fill='#fbbf24')
-    
-    # Labels
-    draw.text((cx-40, 20), "70S Ribosome", fill='#1e3a5f', font=None)
-    draw.text((cx-70, 260), "Prokaryotic (Bacterial)", fill='#64748b', font=None)
-    
-    ensure_dir('/workspaces/Learn/assets/images/mod1/lesson01/70s-ribosome.webp')
-    img.save('/workspaces/Learn/assets/images/mod1/lesson01/70s-ribosome.webp', 'WEBP', quality=85)
-    return img
+    draw.text((10, 10), "TEM: Nucleoid Region", fill='white', style='title')
 
-def create_flagella_sem():
+@diagram(1, 'flagella-sem', (400, 400), '#1a1a2e', tags=('micrograph', 'sem'))
+def create_flagella_sem(draw):
     """Lesson 1: SEM of flagella (400x400)"""
-    img = Image.new('RGB', (400, 400), '#1a1a2e')
-    draw = ImageDraw.Draw(img)
     
     # Simulated SEM appearance (3D shading effect)
     # Bacterial cell (coccus cluster)
@@ -191,36 +170,28 @@ def create_flagella_sem():
     for cx, cy in cells:
         # Shadow
         draw.ellipse([cx-42, cy-32, cx+42, cy+32], fill='#0f0f1a')
-        # Cell body with 3D effect
-        draw.ellipse([cx-40, cy-30, cx+40, cy+30], fill='#4b5563', outline='#6b7280')
-        # Highlight
-        draw.ellipse([cx-25, cy-20, cx-5, cy-5], fill='#9ca3af')
+        # Cell body lit from the top-left, with rim
+        draw.layer(textures.shaded_ellipsoid, cx, cy, 40, 30, '#374151', '#9ca3af', light=(-0.45, -0.45))
+        draw.ellipse([cx-40, cy-30, cx+40, cy+30], outline='#6b7280')
     
     # Flagella (wavy filaments)
     for i, (start_x, start_y) in enumerate([(180, 170), (240, 155), (200, 230)]):
-        points = [(start_x, start_y)]
-        for j in range(1, 15):
-            x = start_x + j * 12
-            y = start_y + int(15 * math.sin(j * 0.5 + i))
-            points.append((x, y))
-        for j in range(len(points)-1):
-            draw.line([points[j], points[j+1]], fill='#d1d5db', width=5)
-            draw.line([points[j], points[j+1]], fill='#9ca3af', width=3)
+        j = np.arange(15)
+        xs = start_x + j * 12
+        ys = batch.wave(j, start_y, 15, 0.5, phase=i)
+        ys[0] = start_y
+        batch.polyline(draw, xs, ys, fill='#d1d5db', width=5)
+        batch.polyline(draw, xs, ys, fill='#9ca3af', width=3)
     
     # Scale bar
     draw.rectangle([280, 370, 360, 378], fill='white')
-    draw.text((285, 380), "2 µm", fill='white', font=None)
-    
-    draw.text((10, 10), "SEM: Bacterial Flagella", fill='white', font=None)
+    draw.text((285, 380), "2 µm", fill='white', style='scale-bar')
     
-    ensure_dir('/workspaces/Learn/assets/images/mod1/lesson01/flagella-sem.webp')
-    img.save('/workspaces/Learn/assets/images/mod1/lesson01/flagella-sem.webp', 'WEBP', quality=85)
-    return img
+    draw.text((10, 10), "SEM: Bacterial Flagella", fill='white', style='title')
 
-def create_nucleus_diagram():
+@diagram(2, 'nucleus-diagram', (1000, 800), tags=('diagram',))
+def create_nucleus_diagram(draw):
     """Lesson 2: Nucleus diagram with layers (1000x800)"""
-    img = Image.new('RGB', (1000, 800), '#f8fafc')
-    draw = ImageDraw.Draw(img)
     
     cx, cy = 500, 400
     
@@ -231,42 +202,31 @@ def create_nucleus_diagram():
     draw.ellipse([cx-290, cy-240, cx+290, cy+240], outline='#60a5fa', width=2)
     
     # Nuclear pores (distributed around envelope)
-    for angle in range(0, 360, 20):
-        rad = math.radians(angle)
-        px = cx + int(295 * math.cos(rad))
-        py = cy + int(245 * math.sin(rad))
-        draw.ellipse([px-8, py-6, px+8, py+6], fill='#10b981', outline='#059669')
+    pore_xs, pore_ys = batch.polar_points(cx, cy, 295, np.arange(0, 360, 20), squash=245 / 295)
+    batch.ellipses(draw, pore_xs, pore_ys, (8, 6), fill='#10b981', outline='#059669')
     
     # Nucleolus (dense region)
     draw.ellipse([cx-80, cy-20, cx+60, cy+100], fill='#f59e0b', outline='#d97706')
-    draw.text((cx-35, cy+30), "Nucleolus", fill='#78350f', font=None)
     
     # Chromatin (dispersed throughout)
-    for i in range(30):
-        angle = i * 37
-        r = 50 + (i * 7) % 180
-        x = cx + int(r * math.cos(math.radians(angle)))
-        y = cy + int(r * 0.7 * math.sin(math.radians(angle)))
-        draw.ellipse([x-5, y-3, x+5, y+3], fill='#ec4899', outline='#db2777')
+    i = np.arange(30)
+    xs, ys = batch.polar_points(cx, cy, 50 + (i * 7) % 180, i * 37, squash=0.7)
+    batch.ellipses(draw, xs, ys, (5, 3), fill='#ec4899', outline='#db2777')
     
     # ER connection
     draw.polygon([(cx-200, cy-200), (cx-350, cy-350), (cx-300, cy-380), (cx-150, cy-230)], 
                  fill='#dbeafe', outline='#3b82f6')
-    draw.text((cx-320, cy-320), "Rough ER", fill='#1e3a5f', font=None)
     
     # Labels
-    draw.text((cx-100, 50), "Eukaryotic Nucleus", fill='#1e3a5f', font=None)
-    draw.text((cx+320, cy-200), "Nuclear\nEnvelope", fill='#1e3a5f', font=None)
-    draw.text((cx+310, cy+50), "Nuclear\nPores", fill='#059669', font=None)
-    
-    ensure_dir('/workspaces/Learn/assets/images/mod1/lesson02/nucleus-diagram.webp')
-    img.save('/workspaces/Learn/assets/images/mod1/lesson02/nucleus-diagram.webp', 'WEBP', quality=85)
-    return img
+    draw.text((cx-100, 50), "Eukaryotic Nucleus", fill='#1e3a5f', style='title')
+    draw.label((cx-10, cy+40), "Nucleolus", near=(cx-35, cy+30), fill='#78350f')
+    draw.label((cx-250, cy-290), "Rough ER", near=(cx-320, cy-320), fill='#1e3a5f')
+    draw.label((cx+240, cy-150), "Nuclear\nEnvelope", near=(cx+320, cy-200), fill='#1e3a5f')
+    draw.label((int(pore_xs[1]), int(pore_ys[1])), "Nuclear\nPores", near=(cx+310, cy+50), fill='#059669')
 
-def create_nucleus_tem():
+@diagram(2, 'nucleus-tem', (500, 400), '#1a1a2e', tags=('micrograph', 'tem'))
+def create_nucleus_tem(draw):
     """Lesson 2: TEM of nucleus (500x400)"""
-    img = Image.new('RGB', (500, 400), '#1a1a2e')
-    draw = ImageDraw.Draw(img)
     
     # Double membrane visible
     cx, cy = 250, 200
@@ -280,62 +240,47 @@ def create_nucleus_tem():
     draw.arc([cx-195, cy-145, cx+195, cy+145], start=200, end=340, fill='#4b5563', width=1)
     
     # Nuclear pores (dark dots on envelope)
-    for angle in range(200, 340, 15):
-        rad = math.radians(angle)
-        px = cx + int(195 * math.cos(rad))
-        py = cy + int(145 * math.sin(rad))
-        draw.ellipse([px-4, py-3, px+4, py+3], fill='#1f2937')
+    xs, ys = batch.polar_points(cx, cy, 195, np.arange(200, 340, 15), squash=145 / 195)
+    batch.ellipses(draw, xs, ys, (4, 3), fill='#1f2937')
     
     # Nucleoplasm (granular texture)
-    for i in range(100):
-        x = cx + (i * 17) % 300 - 150
-        y = cy + (i * 23) % 200 - 100
-        draw.point((x, y), fill='#52525b')
+    draw.layer(textures.paint_dots, *textures.lattice_grain(100, 17, 23, 300, 200, cx-150, cy-100), '#52525b')
     
     # Nucleolus (dense dark region)
     draw.ellipse([cx-40, cy-30, cx+30, cy+40], fill='#27272a')
     
     # Scale bar
     draw.rectangle([350, 370, 430, 378], fill='white')
-    draw.text((355, 380), "0.5 µm", fill='white', font=None)
-    
-    draw.text((10, 10), "TEM: Nuclear Envelope & Pores", fill='white', font=None)
+    draw.text((355, 380), "0.5 µm", fill='white', style='scale-bar')
     
-    ensure_dir('/workspaces/Learn/assets/images/mod1/lesson02/nucleus-tem.webp')
-    img.save('/workspaces/Learn/assets/images/mod1/lesson02/nucleus-tem.webp', 'WEBP', quality=85)
-    return img
+    draw.text((10, 10), "TEM: Nuclear Envelope & Pores", fill='white', style='title')
 
-def create_er_rough():
+@diagram(2, 'er-rough', (400, 300), tags=('diagram', LINE_ART))
+def create_er_rough(draw):
     """Lesson 2: Rough ER diagram (400x300)"""
-    img = Image.new('RGB', (400, 300), '#f8fafc')
-    draw = ImageDraw.Draw(img)
     
     # ER membrane (wavy lines)
-    points_top = [(i, 100 + int(20 * math.sin(i * 0.05))) for i in range(0, 400, 10)]
-    points_bottom = [(i, 180 + int(20 * math.sin(i * 0.05 + 1))) for i in range(0, 400, 10)]
+    xs = np.arange(0, 400, 10)
+    top = batch.wave(xs, 100, 20, 0.05)
+    bottom = batch.wave(xs, 180, 20, 0.05, phase=1)
     
     # Draw ER lumen (between membranes)
-    all_points = points_top + points_bottom[::-1]
-    draw.polygon(all_points, fill='#dbeafe', outline='#3b82f6')
+    draw.polygon(batch.as_points(np.concatenate([xs, xs[::-1]]), np.concatenate([top, bottom[::-1]])),
+                 fill='#dbeafe', outline='#3b82f6')
     
     # Ribosomes (dots on top membrane)
-    for x in range(20, 380, 25):
-        y = 100 + int(20 * math.sin(x * 0.05)) - 8
-        draw.ellipse([x-5, y-5, x+5, y+5], fill='#10b981', outline='#059669')
+    xs = np.arange(20, 380, 25)
+    ribosome_ys = batch.wave(xs, 100, 20, 0.05) - 8
+    batch.ellipses(draw, xs, ribosome_ys, 5, fill='#10b981', outline='#059669')
     
     # Labels
-    draw.text((20, 20), "Rough Endoplasmic Reticulum", fill='#1e3a5f', font=None)
-    draw.text((20, 240), "Ribosomes", fill='#059669', font=None)
-    draw.text((200, 140), "ER Lumen", fill='#1e3a5f', font=None)
-    
-    ensure_dir('/workspaces/Learn/assets/images/mod1/lesson02/er-rough.webp')
-    img.save('/workspaces/Learn/assets/images/mod1/lesson02/er-rough.webp', 'WEBP', quality=85)
-    return img
+    draw.text((20, 20), "Rough Endoplasmic Reticulum", fill='#1e3a5f', style='title')
+    draw.label((int(xs[2]), int(ribosome_ys[2])), "Ribosomes", fill='#059669')
+    draw.text((200, 140), "ER Lumen", fill='#1e3a5f', style='label')
 
-def create_nucleolus_diagram():
+@diagram(2, 'nucleolus-diagram', (400, 400), tags=('diagram', LINE_ART))
+def create_nucleolus_diagram(draw):
     """Lesson 2: Nucleolus structure (400x400)"""
-    img = Image.new('RGB', (400, 400), '#f8fafc')
-    draw = ImageDraw.Draw(img)
     
     cx, cy = 200, 200
     
@@ -344,33 +289,24 @@ def create_nucleolus_diagram():
     
     # Fibrillar centre (inner)
     draw.ellipse([cx-60, cy-60, cx+60, cy+60], fill='#fbbf24', outline='#f59e0b')
-    draw.text((cx-35, cy-10), "Fibrillar\nCentre", fill='#78350f', font=None)
+    draw.text((cx-35, cy-10), "Fibrillar\nCentre", fill='#78350f', style='label')
     
     # Dense fibrillar component (ring)
     for r in range(70, 100, 10):
         draw.ellipse([cx-r, cy-r, cx+r, cy+r], outline='#f59e0b', width=8)
     
     # Granular component (outer)
-    for angle in range(0, 360, 10):
-        rad = math.radians(angle)
-        for r in range(110, 140, 15):
-            x = cx + int(r * math.cos(rad))
-            y = cy + int(r * math.sin(rad))
-            draw.ellipse([x-4, y-4, x+4, y+4], fill='#fcd34d')
+    angle, r = np.meshgrid(np.arange(0, 360, 10), np.arange(110, 140, 15), indexing='ij')
+    batch.ellipses(draw, *batch.polar_points(cx, cy, r, angle), 4, fill='#fcd34d')
     
     # Labels
-    draw.text((cx-50, 20), "Nucleolus Structure", fill='#1e3a5f', font=None)
-    draw.text((cx+70, cy-80), "Dense\nFibrillar", fill='#92400e', font=None)
-    draw.text((cx+110, cy+50), "Granular\nComponent", fill='#92400e', font=None)
-    
-    ensure_dir('/workspaces/Learn/assets/images/mod1/lesson02/nucleolus-diagram.webp')
-    img.save('/workspaces/Learn/assets/images/mod1/lesson02/nucleolus-diagram.webp', 'WEBP', quality=85)
-    return img
+    draw.text((cx-50, 20), "Nucleolus Structure", fill='#1e3a5f', style='title')
+    draw.label((cx+57, cy-57), "Dense\nFibrillar", near=(cx+70, cy-80), fill='#92400e')
+    draw.label((cx+117, cy+43), "Granular\nComponent", near=(cx+110, cy+50), fill='#92400e')
 
-def create_lm_vs_tem():
+@diagram(3, 'lm-vs-tem-comparison', (800, 400), tags=('diagram', 'tem'))
+def create_lm_vs_tem(draw, rng):
     """Lesson 3: LM vs TEM comparison (800x400)"""
-    img = Image.new('RGB', (800, 400), '#f8fafc')
-    draw = ImageDraw.Draw(img)
     
     # Left side - LM image (colourful but low detail)
     draw.rectangle([20, 50, 380, 350], fill='#fef3c7', outline='#d97706', width=2)
@@ -380,13 +316,13 @@ def create_lm_vs_tem():
     draw.ellipse([cx1-100, 120, cx1+100, 280], fill='#dbeafe', outline='#3b82f6', width=3)
     # Nucleus visible
     draw.ellipse([cx1-40, 170, cx1+40, 230], fill='#8b5cf6', outline='#7c3aed')
-    draw.text((cx1-30, 190), "N", fill='white', font=None)
+    draw.text((cx1-30, 190), "N", fill='white', style='label')
     # Cell wall visible
     draw.ellipse([cx1-105, 115, cx1+105, 285], outline='#10b981', width=4)
     
-    draw.text((cx1-80, 70), "Light Microscope", fill='#1e3a5f', font=None)
-    draw.text((cx1-70, 300), "Resolution: ~200 nm", fill='#64748b', font=None)
-    draw.text((cx1-50, 320), "Can see: Nucleus", fill='#64748b', font=None)
+    draw.text((cx1-80, 70), "Light Microscope", fill='#1e3a5f', style='title')
+    draw.text((cx1-70, 300), "Resolution: ~200 nm", fill='#64748b', style='caption')
+    draw.text((cx1-50, 320), "Can see: Nucleus", fill='#64748b', style='caption')
     
     # Arrow
     draw.polygon([(390, 180), (410, 200), (390, 220)], fill='#64748b')
@@ -400,33 +336,22 @@ def create_lm_vs_tem():
     # Nucleus with envelope
     draw.ellipse([cx2-45, 165, cx2+45, 235], outline='#9ca3af', width=2)
     # Nuclear pores
-    for angle in range(0, 360, 30):
-        rad = math.radians(angle)
-        px = cx2 + int(40 * math.cos(rad))
-        py = 200 + int(30 * math.sin(rad))
-        draw.ellipse([px-3, py-2, px+3, py+2], fill='#374151')
+    xs, ys = batch.polar_points(cx2, 200, 40, np.arange(0, 360, 30), squash=30 / 40)
+    batch.ellipses(draw, xs, ys, (3, 2), fill='#374151')
     # Mitochondria visible
     draw.ellipse([cx2-80, 140, cx2-40, 170], outline='#6b7280')
     draw.ellipse([cx2+30, 240, cx2+70, 270], outline='#6b7280')
     # Ribosomes (tiny dots)
-    for _ in range(30):
-        import random
-        x = cx2 + random.randint(-90, 90)
-        y = random.randint(130, 270)
-        draw.point((x, y), fill='#4b5563')
+    xs, ys = textures.speckle_coords(rng, 30, (cx2-90, cx2+90), (130, 270))
+    draw.layer(textures.paint_dots, xs, ys, '#4b5563')
     
-    draw.text((cx2-100, 70), "Transmission EM", fill='#f8fafc', font=None)
-    draw.text((cx2-90, 300), "Resolution: ~0.2 nm", fill='#9ca3af', font=None)
-    draw.text((cx2-110, 320), "Can see: Ribosomes, membranes", fill='#9ca3af', font=None)
-    
-    ensure_dir('/workspaces/Learn/assets/images/mod1/lesson03/lm-vs-tem-comparison.webp')
-    img.save('/workspaces/Learn/assets/images/mod1/lesson03/lm-vs-tem-comparison.webp', 'WEBP', quality=85)
-    return img
+    draw.text((cx2-100, 70), "Transmission EM", fill='#f8fafc', style='title')
+    draw.text((cx2-90, 300), "Resolution: ~0.2 nm", fill='#9ca3af', style='caption')
+    draw.text((cx2-110, 320), "Can see: Ribosomes, membranes", fill='#9ca3af', style='caption')
 
-def create_sem_pollen():
+@diagram(3, 'sem-pollen', (400, 400), '#1a1a2e', tags=('micrograph', 'sem'))
+def create_sem_pollen(draw):
     """Lesson 3: SEM pollen (400x400)"""
-    img = Image.new('RGB', (400, 400), '#1a1a2e')
-    draw = ImageDraw.Draw(img)
     
     # Multiple pollen grains with 3D effect
     grains = [(120, 150, 60), (280, 180, 50), (200, 280, 70), (320, 300, 40)]
@@ -434,34 +359,24 @@ def create_sem_pollen():
     for cx, cy, r in grains:
         # Shadow
         draw.ellipse([cx-r-5, cy-r//2+10, cx+r+5, cy+r//2+20], fill='#0f0f1a')
-        # Main body with spherical shading
-        for i in range(r, 0, -2):
-            color_val = 60 + int((r-i) * 2)
-            color = f'#{color_val:02x}{color_val:02x}{color_val+20:02x}'
-            draw.ellipse([cx-i, cy-i//2, cx+i, cy+i//2], fill=color)
+        # Main body with spherical shading, brightest at the centre
+        draw.layer(textures.shaded_ellipsoid, cx, cy, r, r//2, (60, 60, 80), (60 + 2*r, 60 + 2*r, 80 + 2*r))
         # Surface texture (exine patterns)
-        for angle in range(0, 360, 20):
-            rad = math.radians(angle)
-            for dist in range(10, r-5, 15):
-                x = cx + int(dist * math.cos(rad))
-                y = cy + int(dist * 0.5 * math.sin(rad))
-                if (x-cx)**2 + (y-cy)**2*4 < r*r:
-                    draw.ellipse([x-3, y-2, x+3, y+2], fill='#374151')
+        angle, dist = np.meshgrid(np.radians(np.arange(0, 360, 20)), np.arange(10, r-5, 15))
+        xs = cx + (dist * np.cos(angle)).astype(int)
+        ys = cy + (dist * 0.5 * np.sin(angle)).astype(int)
+        inside = (xs-cx)**2 + (ys-cy)**2*4 < r*r
+        draw.layer(textures.paint_dots, xs[inside], ys[inside], '#374151', radius=(3, 2))
     
     # Scale bar
     draw.rectangle([280, 370, 360, 378], fill='white')
-    draw.text((285, 380), "10 µm", fill='white', font=None)
-    
-    draw.text((10, 10), "SEM: Pollen Grains (3D Surface)", fill='white', font=None)
+    draw.text((285, 380), "10 µm", fill='white', style='scale-bar')
     
-    ensure_dir('/workspaces/Learn/assets/images/mod1/lesson03/sem-pollen.webp')
-    img.save('/workspaces/Learn/assets/images/mod1/lesson03/sem-pollen.webp', 'WEBP', quality=85)
-    return img
+    draw.text((10, 10), "SEM: Pollen Grains (3D Surface)", fill='white', style='title')
 
-def create_tem_mitochondria():
+@diagram(3, 'tem-mitochondria', (400, 400), '#1a1a2e', tags=('micrograph', 'tem'))
+def create_tem_mitochondria(draw):
     """Lesson 3: TEM mitochondria (400x400)"""
-    img = Image.new('RGB', (400, 400), '#1a1a2e')
-    draw = ImageDraw.Draw(img)
     
     # Mitochondria cross-section
     cx, cy = 200, 200
@@ -472,48 +387,33 @@ def create_tem_mitochondria():
     draw.ellipse([cx-110, cy-70, cx+110, cy+70], outline='#9ca3af', width=1)
     
     # Cristae folds (invaginations)
-    for angle in [45, 90, 135, 225, 270, 315]:
-        rad = math.radians(angle)
-        r_inner, r_outer = 60, 105
-        x1 = cx + int(r_inner * math.cos(rad))
-        y1 = cy + int(r_inner * 0.6 * math.sin(rad))
-        x2 = cx + int(r_outer * math.cos(rad))
-        y2 = cy + int(r_outer * 0.6 * math.sin(rad))
-        draw.line([(x1, y1), (x2, y2)], fill='#9ca3af', width=3)
-        # Crista membrane fold back
-        x3 = cx + int((r_outer-10) * math.cos(rad + 0.2))
-        y3 = cy + int((r_outer-10) * 0.6 * math.sin(rad + 0.2))
-        draw.line([(x2, y2), (x3, y3)], fill='#9ca3af', width=2)
+    angles = np.array([45, 90, 135, 225, 270, 315])
+    r_inner, r_outer = 60, 105
+    x1, y1 = batch.polar_points(cx, cy, r_inner, angles, squash=0.6)
+    x2, y2 = batch.polar_points(cx, cy, r_outer, angles, squash=0.6)
+    batch.segments(draw, x1, y1, x2, y2, fill='#9ca3af', width=3)
+    # Crista membrane fold back
+    x3, y3 = batch.polar_points(cx, cy, r_outer-10, angles + math.degrees(0.2), squash=0.6)
+    batch.segments(draw, x2, y2, x3, y3, fill='#9ca3af', width=2)
     
     # Matrix (granular interior)
-    for i in range(50):
-        angle = i * 37
-        r = (i * 11) % 50
-        x = cx + int(r * math.cos(math.radians(angle)))
-        y = cy + int(r * 0.6 * math.sin(math.radians(angle)))
-        draw.point((x, y), fill='#52525b')
+    draw.layer(textures.paint_dots, *textures.spiral_grain(50, cx, cy, radius_mod=50), '#52525b')
     
     # Scale bar
     draw.rectangle([280, 370, 360, 378], fill='white')
-    draw.text((285, 380), "0.5 µm", fill='white', font=None)
+    draw.text((285, 380), "0.5 µm", fill='white', style='scale-bar')
     
-    draw.text((10, 10), "TEM: Mitochondrion (Cristae Visible)", fill='white', font=None)
-    
-    ensure_dir('/workspaces/Learn/assets/images/mod1/lesson03/tem-mitochondria.webp')
-    img.save('/workspaces/Learn/assets/images/mod1/lesson03/tem-mitochondria.webp', 'WEBP', quality=85)
-    return img
+    draw.text((10, 10), "TEM: Mitochondrion (Cristae Visible)", fill='white', style='title')
 
-def create_light_microscope():
+@diagram(3, 'light-microscope-diagram', (600, 800), tags=('diagram', LINE_ART))
+def create_light_microscope(draw):
     """Lesson 3: Light microscope diagram (600x800)"""
-    img = Image.new('RGB', (600, 800), '#f8fafc')
-    draw = ImageDraw.Draw(img)
     
     cx = 300
     
     # Eyepiece (top)
     draw.rectangle([cx-30, 50, cx+30, 150], fill='#64748b', outline='#475569', width=2)
     draw.ellipse([cx-35, 40, cx+35, 60], fill='#94a3b8')
-    draw.text((cx-25, 20), "Eyepiece (10×)", fill='#1e3a5f', font=None)
     
     # Body tube
     draw.rectangle([cx-40, 150, cx+40, 300], fill='#e2e8f0', outline='#64748b', width=2)
@@ -530,24 +430,21 @@ def create_light_microscope():
     ]
     for ox, oy, label in objectives:
         draw.polygon([(ox-20, oy), (ox+20, oy), (ox+15, oy+80), (ox-15, oy+80)], fill='#3b82f6', outline='#1d4ed8')
-        draw.text((ox-15, oy+35), label, fill='white', font=None)
+        draw.text((ox-15, oy+35), label, fill='white', style='label')
     
     # Stage
     draw.rectangle([cx-150, 450, cx+150, 470], fill='#475569', outline='#1e293b', width=2)
     draw.rectangle([cx-120, 430, cx+120, 450], fill='#f1f5f9', outline='#64748b')  # Stage opening
-    draw.text((cx-40, 475), "Stage", fill='#1e3a5f', font=None)
     
     # Specimen slide
     draw.rectangle([cx-100, 435, cx+100, 450], fill='#dbeafe', outline='#3b82f6')
     
     # Condenser (below stage)
     draw.polygon([(cx-60, 500), (cx+60, 500), (cx+40, 560), (cx-40, 560)], fill='#10b981', outline='#059669')
-    draw.text((cx-45, 520), "Condenser", fill='white', font=None)
     
     # Light source
     draw.rectangle([cx-50, 700, cx+50, 750], fill='#f59e0b', outline='#d97706', width=2)
     draw.ellipse([cx-30, 660, cx+30, 700], fill='#fcd34d')
-    draw.text((cx-40, 755), "Light Source", fill='#1e3a5f', font=None)
     
     # Light rays
     for offset in [-20, 0, 20]:
@@ -559,107 +456,444 @@ def create_light_microscope():
     # Arm
     draw.polygon([(cx+40, 150), (cx+100, 150), (cx+100, 700), (cx+60, 700)], fill='#64748b', outline='#475569')
     
-    # Title
-    draw.text((cx-120, 5), "Compound Light Microscope", fill='#1e3a5f', font=None)
-    
-    ensure_dir('/workspaces/Learn/assets/images/mod1/lesson03/light-microscope-diagram.webp')
-    img.save('/workspaces/Learn/assets/images/mod1/lesson03/light-microscope-diagram.webp', 'WEBP', quality=85)
-    return img
+    # Title and labels
+    draw.text((cx-120, 5), "Compound Light Microscope", fill='#1e3a5f', style='title')
+    draw.label((cx-30, 60), "Eyepiece (10×)", near=(cx-25, 20), fill='#1e3a5f')
+    draw.label((cx-140, 460), "Stage", near=(cx-40, 475), fill='#1e3a5f')
+    draw.label((cx-50, 530), "Condenser", near=(cx-45, 520), fill='#1e3a5f')
+    draw.label((cx-50, 725), "Light Source", near=(cx-40, 755), fill='#1e3a5f')
 
-def create_scale_bar_example():
-    """Lesson 3: Scale bar calculation practice (500x400)"""
-    img = Image.new('RGB', (500, 400), '#f8fafc')
-    draw = ImageDraw.Draw(img)
-    
-    # Draw a cell-like shape
-    cx, cy = 250, 200
-    draw.ellipse([cx-150, cy-100, cx+150, cy+100], fill='#dbeafe', outline='#3b82f6', width=3)
-    
-    # Nucleus
-    draw.ellipse([cx-40, cy-30, cx+40, cy+30], fill='#8b5cf6', outline='#7c3aed')
-    
-    # Some organelles
-    draw.ellipse([cx-100, cy-50, cx-60, cy-20], outline='#10b981', width=2)
-    draw.ellipse([cx+60, cy+20, cx+110, cy+60], outline='#10b981', width=2)
-    
-    # Scale bar
-    draw.rectangle([50, 350, 150, 362], fill='#1e293b')
-    draw.text((55, 365), "Scale bar = 20 µm", fill='#1e293b', font=None)
-    
-    # Measurement prompt
-    draw.text((200, 365), "Measure the cell diameter!", fill='#1e3a5f', font=None)
-    
-    # Title
-    draw.text((cx-100, 20), "Practice: Calculate Actual Size", fill='#1e3a5f', font=None)
-    
-    ensure_dir('/workspaces/Learn/assets/images/mod1/lesson03/scale-bar-example.webp')
-    img.save('/workspaces/Learn/assets/images/mod1/lesson03/scale-bar-example.webp', 'WEBP', quality=85)
-    return img
+# Output roots (primary first), variants written alongside every output,
+# the default encode budget, whether the manifest uses hashed filenames,
+# whether line-art is written as indexed-palette images, and the theme
+# variants written alongside each diagram
+BuildOptions = namedtuple('BuildOptions', 'roots retina fallbacks budget min_psnr svg hashed_names reuse_layers '
+                                          'palette themes')
 
-def create_thumbnails():
-    """Create 200x150 thumbnails for all images"""
-    import glob
+def spec_jobs(spec_dir=SPEC_DIR):
+    """One job per declarative spec found under spec_dir.
+
+    A spec that cannot be loaded still gets a job, named and placed after
+    its file, whose render raises the SpecError; it is reported as a failed
+    job instead of stopping every build.
+    """
+    jobs = []
+    for path in discover_specs(spec_dir):
+        rel_path = os.path.relpath(path, spec_dir)
+        try:
+            spec = load_spec(path)
+        except SpecError:
+            lesson_dir = os.path.basename(os.path.dirname(path))
+            jobs.append(job(int(lesson_dir.replace('lesson', '')), draw_spec_file,
+                            f"{lesson_dir}/{os.path.splitext(os.path.basename(path))[0]}.webp", (1, 1),
+                            params={'spec_path': rel_path}, name=f"spec:{rel_path}", inputs=[path]))
+            continue
+        lesson = int(spec['output'].split('/')[0].replace('lesson', ''))
+        jobs.append(job(lesson, draw_spec_file, spec['output'], spec['size'],
+                        spec.get('background', DEFAULT_BACKGROUND),
+                        encode={**DEFAULT_ENCODE, **spec.get('encode', {})},
+                        params={'spec_path': rel_path},
+                        name=f"spec:{rel_path}", inputs=[path], budget=spec.get('budget'),
+                        tags=spec.get('tags', ())))
+    return jobs
+
+def build_jobs():
+    """Registered and spec jobs together, in lesson order"""
+    return sorted(REGISTRY + spec_jobs(), key=lambda j: j.lesson)
+
+def job_seed(output):
+    """Stable per-diagram RNG seed derived from its output path"""
+    return int.from_bytes(hashlib.sha256(output.encode('utf-8')).digest()[:8], 'big')
+
+def capture_job(job, layer_cache=None):
+    """Run a job's generator once into a display list.
+
+    Generators that take an rng argument get a fresh Generator seeded from
+    the output path, so every capture of a diagram is identical. Labels
+    recorded with draw.label are placed here, against the base layer, which
+    comes from layer_cache (a layers.LayerCache) when given.
+    """
+    params = dict(job.params)
+    if 'rng' in inspect.signature(job.func).parameters:
+        params['rng'] = np.random.default_rng(job_seed(job.output))
+    return label_layout.resolve(capture(job.func, job.size, job.background, **params), layer_cache)
+
+def render_job(job, options):
+    """Render a job's 1x image, plus its @2x image when enabled, from one capture.
+
+    With --svg, line-art jobs also return an SVG document of the same capture
+    and skip the @2x raster, which the SVG makes redundant. With --palette,
+    line-art rasters are remapped onto their declared colours (mode "P"). With
+    options.reuse_layers, unchanged base layers come from this process's
+    layer cache, which only outlives one diagram in a serial --watch and in
+    the worker and serve commands (see layers.py).
+    """
+    cache = BASE_CACHE if options.reuse_layers else None
+    display_list = capture_job(job, cache)
+    vector = options.svg and LINE_ART in job.tags
+    img = layers.render(display_list, cache=cache)
+    img_2x = layers.render(display_list, scale=2, cache=cache) if options.retina and not vector else None
+    svg = render_svg(display_list).encode('utf-8') if vector else None
+    if options.palette and LINE_ART in job.tags:
+        colors = palette.declared_colors(display_list)
+        img = palette.indexed(img, colors)
+        img_2x = palette.indexed(img_2x, colors) if img_2x is not None else None
+    return img, img_2x, svg
+
+# Replay and encoding code shared by every job, plus the font files
+ENGINE_FINGERPRINT = make_key(module_fingerprint(display_list, encoding, fonts, label_layout, layers, palette,
+                                                 stamps, svg_backend, themes),
+                              fonts.fingerprint())
+
+def source_key(job):
+    """Key of a job's drawing alone (source, engine, params, inputs, canvas),
+    independent of build options; the server derives its ETags from it"""
+    inputs = [file_digest(path) for path in job.inputs]
+    return make_key(function_fingerprint(job.func), ENGINE_FINGERPRINT, job.params, inputs,
+                    job.size, job.background)
+
+def job_themes(job, options):
+    """The requested themes that apply to job (none for micrographs)"""
+    if set(job.tags) & set(themes.UNTHEMED_TAGS):
+        return ()
+    return options.themes
+
+def job_key(job, options):
+    """Cache key: generator source, parameters, Pillow version and encode settings"""
+    inputs = [file_digest(path) for path in job.inputs]
+    variants = [job.size, job.background, options.retina, options.fallbacks,
+                options.svg and LINE_ART in job.tags, THUMBNAIL_SIZE, THUMBNAIL_ENCODE, job.budget or options.budget, options.min_psnr,
+                options.palette and LINE_ART in job.tags, job_themes(job, options)]
+    return make_key(function_fingerprint(job.func), ENGINE_FINGERPRINT, job.params, job.encode,
+                    inputs, variants)
+
+def encode_job(job, options, sink=None):
+    """Render a job and encode its responsive set into sink (default: disk)"""
+    img, img_2x, svg = render_job(job, options)
+    return write_variants(options.roots, job.output, img, job.encode, img_2x, options.fallbacks,
+                          job.budget or options.budget, options.min_psnr, sink=sink, svg=svg,
+                          themes=job_themes(job, options))
+
+def run_job(job, options):
+    """Render one job and write its responsive set, capturing any error instead
+    of raising. Returns (ok, traceback, seconds, sidecar entry)."""
+    start = time.perf_counter()
+    try:
+        entry = encode_job(job, options)
+    except Exception:
+        return False, traceback.format_exc(), time.perf_counter() - start, None
+    return True, None, time.perf_counter() - start, entry
+
+def verify_job(job, options):
+    """Re-render one job in memory and compare digests with the files on disk.
+    Returns (ok, traceback, seconds, list of mismatched or missing paths)."""
+    start = time.perf_counter()
+    rendered = {}
+    try:
+        encode_job(job, options, sink=rendered.__setitem__)
+        mismatches = []
+        for rel_path, data in sorted(rendered.items()):
+            path = os.path.join(options.roots[0], rel_path)
+            if not os.path.exists(path):
+                mismatches.append(f"{rel_path} (missing)")
+            elif file_digest(path) != hashlib.sha256(data).hexdigest():
+                mismatches.append(rel_path)
+    except Exception:
+        return False, traceback.format_exc(), time.perf_counter() - start, None
+    return True, None, time.perf_counter() - start, mismatches
+
+def bench_once(job, options):
+    """One timed pass over a job's stages, encoding in memory.
+    Returns ({stage: seconds}, total encoded bytes)."""
+    sizes = {}
+    start = time.perf_counter()
+    img, img_2x, svg = render_job(job, options)
+    timings = {'draw': time.perf_counter() - start}
+    write_variants(options.roots, job.output, img, job.encode, img_2x, options.fallbacks,
+                   job.budget or options.budget, options.min_psnr,
+                   sink=lambda rel_path, data: sizes.__setitem__(rel_path, len(data)),
+                   timings=timings, svg=svg, themes=job_themes(job, options))
+    return timings, sum(sizes.values())
+
+def run_bench(args, jobs, options):
+    """The bench command: time every job, optionally save or diff a baseline"""
+    print(f"Benchmarking {len(jobs)} diagrams ({args.reps} reps each)...")
+    results = benchmark.run_benchmark(jobs, lambda job: bench_once(job, options), args.reps)
+    print(f"\nTotal {results['elapsed']:.2f}s, peak RSS {results['peak_rss_kb']} KB")
+    if args.save:
+        benchmark.save_results(args.save, results)
+        print(f"Saved results to {args.save}")
+    if args.baseline:
+        regressions = benchmark.compare(benchmark.load_results(args.baseline), results,
+                                        args.time_threshold / 100, args.size_threshold / 100)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) against {args.baseline}:")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print(f"No regressions against {args.baseline}")
+    return 0
+
+def run_pool(worker, jobs, max_workers, *args):
+    """Yield worker(job, *args) for each job in order, fanning out over a
+    process pool unless max_workers is 1"""
+    if max_workers == 1 or len(jobs) <= 1:
+        for job in jobs:
+            yield worker(job, *args)
+        return
+    with ProcessPoolExecutor(max_workers=min(max_workers, len(jobs))) as executor:
+        futures = [executor.submit(worker, job, *args) for job in jobs]
+        for future in futures:
+            yield future.result()
+
+def describe_encoding(variant):
+    """Short summary of how the budget search encoded a variant"""
+    size = f"{variant['bytes'] / 1024:.1f} KB"
+    if 'colors' in variant:
+        return f"{size} lossless {variant['type'].split('/')[1].upper()}, {variant['colors']} colours"
+    if variant.get('lossless'):
+        return f"{size} lossless"
+    if 'quality' in variant:
+        return f"{size} q{variant['quality']}, {variant['psnr']} dB"
+    return size
+
+def primary_outputs(job, options):
+    """Paths a job's 1x primary may be written to: indexed line-art becomes
+    PNG when that encodes smaller"""
+    if options.palette and LINE_ART in job.tags:
+        return [variant_path(job.output, '', fmt) for fmt in INDEXED_FORMATS]
+    return [job.output]
+
+def primary_variant(entry):
+    """Sidecar record of the 1x primary raster (an SVG, listed first under
+    --svg, has no density)"""
+    return next(v for v in entry['variants'] if v.get('density') == 1 and v['type'] != MIME_TYPES['SVG'])
+
+def primary_output(job, entry):
+    """Path the 1x primary of a written job went to"""
+    return posixpath.join(posixpath.dirname(job.output), primary_variant(entry)['src'])
+
+def render_all(jobs, max_workers, cache, options, show_cached=True):
+    """Fan stale jobs out over a process pool and report results in build order.
+
+    Jobs whose cache key still matches an existing output are skipped (and
+    only listed if show_cached). Returns the failures as (job name,
+    traceback) pairs and the sidecar entries of the jobs that were rendered,
+    keyed by output.
+    """
+    keys = [job_key(job, options) for job in jobs]
+    stale = [job for job, key in zip(jobs, keys)
+             if not any(cache.is_fresh(output, key) for output in primary_outputs(job, options))]
+    results = run_pool(run_job, stale, max_workers, options)
+
+    failures = []
+    entries = {}
+    current_lesson = None
+    for job, key in zip(jobs, keys):
+        if job not in stale and not show_cached:
+            continue
+        if job.lesson != current_lesson:
+            print(f"Creating Lesson {job.lesson} images...")
+            current_lesson = job.lesson
+        name = job.name
+        if job not in stale:
+            print(f"  {name} (cached)")
+            continue
+        ok, error, elapsed, entry = next(results)
+        if ok:
+            cache.record(primary_output(job, entry), key)
+            entries[job.output] = entry
+            print(f"  {name} ({elapsed:.2f}s, {describe_encoding(primary_variant(entry))})")
+        else:
+            print(f"  {name} FAILED ({elapsed:.2f}s)")
+            failures.append((name, error))
+    return failures, entries
+
+def build(jobs, max_workers, cache, options, show_cached=True):
+    """Render the stale jobs, update the sidecars and image manifest, and save
+    the cache manifest. Returns the failures and the sidecar entries, as
+    render_all does."""
+    try:
+        failures, entries = render_all(jobs, max_workers, cache, options, show_cached)
+        update_sidecars(options.roots, entries)
+        write_manifest(options.roots, options.hashed_names)
+    finally:
+        cache.save()
+    if failures:
+        print(f"\n{len(failures)} of {len(jobs)} images failed:")
+        for name, error in failures:
+            print(f"\n{name}:\n{error}")
+    return failures, entries
+
+def watch_build(args, options):
+    """The --watch loop: build once, then after every edit reload the changed
+    modules and rebuild whatever the edit affected"""
+    def rebuild(changed):
+        module = sys.modules[__name__]
+        if changed is not None:
+            # The reloaded generators register themselves again
+            registry.REGISTRY.clear()
+            module = watch.reload_modules(changed, BASE_PATH, 'create_images')
+        start = time.perf_counter()
+        jobs = module.select(module.build_jobs(), args.only, args.lesson, args.tag)
+        cache = module.BuildCache(options.roots[0], enabled=changed is not None or not args.force,
+                                  mirrors=options.roots[1:])
+        failures, entries = module.build(jobs, args.jobs, cache, options, show_cached=False)
+        print(f"Rebuilt {len(entries)} of {len(jobs)} diagrams in {time.perf_counter() - start:.2f}s"
+              + (f", {len(failures)} failed" if failures else ""))
+
+    return watch.watch(rebuild, lambda: watch.watched_files(BASE_PATH, SPEC_DIR))
+
+def verify_all(jobs, max_workers, options):
+    """Re-render every job in memory and report outputs whose bytes differ
+    from the files on disk. Returns the number of problem jobs."""
+    problems = 0
+    for job, (ok, error, elapsed, mismatches) in zip(jobs, run_pool(verify_job, jobs, max_workers, options)):
+        if not ok:
+            problems += 1
+            print(f"  {job.name} FAILED ({elapsed:.2f}s)\n{error}")
+        elif mismatches:
+            problems += 1
+            print(f"  {job.name} DIFFERS: {', '.join(mismatches)}")
+        else:
+            print(f"  {job.name} ok")
+    return problems
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('command', nargs='?', default='build', choices=['build', 'bench', 'manifest', 'worker', 'serve'],
+                        help='build the images (default), benchmark the render stages, re-index '
+                             'the image manifest, answer JSON-lines render requests on '
+                             'stdin/stdout, or serve renders over HTTP')
+    selection = parser.add_argument_group('selection (default: every diagram)')
+    selection.add_argument('--only', action='append', default=[], metavar='NAME',
+                              help='diagram by output name (nucleus-diagram) or generator; repeatable, comma-separated')
+    selection.add_argument('--lesson', action='append', default=[], type=int, metavar='N',
+                              help='diagrams of lesson N (repeatable)')
+    selection.add_argument('--tag', action='append', default=[],
+                              help='diagrams with this tag, e.g. micrograph or line-art (repeatable)')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1,
+                        help='number of worker processes (default: CPU count, 1 = no pool)')
+    parser.add_argument('-o', '--out-root', default=BASE_PATH,
+                        help='directory that receives lessonNN/ outputs (default: next to this script)')
+    parser.add_argument('--mirror', action='append', default=[], metavar='DIR',
+                        help='extra output root to hard-link or copy every output into (repeatable)')
+    parser.add_argument('--verify', action='store_true',
+                        help='re-render in memory and check outputs on disk are byte-identical')
+    parser.add_argument('--watch', action='store_true',
+                        help='keep running and rebuild the diagrams affected by each edit '
+                             '(with -j 1, label-only edits also reuse the cached base layers)')
+    parser.add_argument('--force', action='store_true',
+                        help='ignore the build cache and re-render everything')
+    parser.add_argument('--no-retina', dest='retina', action='store_false',
+                        help='skip @2x variants')
+    parser.add_argument('--svg', action='store_true',
+                        help='also export line-art diagrams as minified SVG (replaces their @2x)')
+    parser.add_argument('--palette', action='store_true',
+                        help='write line-art as indexed-palette images over their declared colours, '
+                             'losslessly as WebP or PNG (whichever is smaller)')
+    parser.add_argument('--themes', default='',
+                        help=f"comma-separated theme variants to write for every diagram "
+                             f"({', '.join(themes.THEMES)}; micrographs are left as they are)")
+    parser.add_argument('--hashed-names', action='store_true',
+                        help='also publish content-hashed copies and list them in the image manifest')
+    parser.add_argument('--fallbacks', default='',
+                        help=f"comma-separated extra formats ({', '.join(available_fallbacks())})")
+    parser.add_argument('--budget', type=float, default=DEFAULT_BUDGET / 1024,
+                        help='default byte budget per encoded image, in KB (default: %(default)g)')
+    parser.add_argument('--min-psnr', type=float, default=DEFAULT_MIN_PSNR,
+                        help='quality floor for the budget search, in dB (default: %(default)g)')
+    bench = parser.add_argument_group('bench options')
+    bench.add_argument('--reps', type=int, default=5,
+                       help='repetitions per diagram (default: %(default)s)')
+    bench.add_argument('--save', metavar='JSON', help='write benchmark results to this file')
+    bench.add_argument('--baseline', metavar='JSON',
+                       help='fail if results regress against this saved benchmark')
+    bench.add_argument('--time-threshold', type=float, default=20,
+                       help='allowed slowdown per diagram, in percent (default: %(default)g)')
+    bench.add_argument('--size-threshold', type=float, default=5,
+                       help='allowed growth in encoded bytes, in percent (default: %(default)g)')
+    serve = parser.add_argument_group('serve options')
+    serve.add_argument('--host', default=server.DEFAULT_HOST, help='address to bind (default: %(default)s)')
+    serve.add_argument('--port', type=int, default=server.DEFAULT_PORT,
+                             help='port to listen on (default: %(default)s)')
+    serve.add_argument('--cache-mb', type=float, default=server.DEFAULT_MEMORY_CACHE / 2**20,
+                             help='in-memory render cache size, in MB (default: %(default)g)')
+    args = parser.parse_args(argv)
+    if args.jobs < 1:
+        parser.error('--jobs must be at least 1')
+    args.only = [name for value in args.only for name in value.split(',') if name]
+    args.fallbacks = tuple(name for name in args.fallbacks.split(',') if name)
+    unknown = set(args.fallbacks) - set(available_fallbacks())
+    if unknown:
+        parser.error(f"unsupported fallback format(s): {', '.join(sorted(unknown))}")
+    args.themes = tuple(name for name in args.themes.split(',') if name)
+    unknown = set(args.themes) - set(themes.THEMES)
+    if unknown:
+        parser.error(f"unknown theme(s): {', '.join(sorted(unknown))}")
+    return args
+
+def main(argv=None):
+    args = parse_args(argv)
+    try:
+        jobs = select(build_jobs(), args.only, args.lesson, args.tag)
+    except KeyError as e:
+        print(f"Unknown diagram(s): {e.args[0]}", file=sys.stderr)
+        return 2
+    if not jobs:
+        print("No diagrams match the selection", file=sys.stderr)
+        return 2
+    roots = [os.path.abspath(args.out_root), *(os.path.abspath(m) for m in args.mirror)]
+    # Verification and benchmarks always render every layer afresh
+    options = BuildOptions(roots, args.retina, args.fallbacks, int(args.budget * 1024), args.min_psnr,
+                           args.svg, args.hashed_names, not args.verify and args.command != 'bench',
+                           args.palette, args.themes)
+    
+    if args.command == 'bench':
+        return run_bench(args, jobs, options)
+    
+    if args.command == 'manifest':
+        manifest = write_manifest(roots, args.hashed_names)
+        print(f"Indexed {len(manifest['images'])} images ({len(manifest['precache'])} precache URLs) "
+              f"into {os.path.join(roots[0], MANIFEST_NAME)}")
+        return 0
+    
+    if args.command == 'worker':
+        return worker.serve(worker.Renderer(jobs, capture_job, BASE_CACHE), sys.stdin, sys.stdout)
+    
+    if args.command == 'serve':
+        service = server.DiagramService(worker.Renderer(jobs, capture_job, BASE_CACHE), source_key,
+                                        os.path.join(roots[0], server.DISK_CACHE_NAME),
+                                        int(args.cache_mb * 2**20))
+        return server.serve(service, args.host, args.port)
+    
+    if args.verify:
+        print(f"Verifying {len(jobs)} diagrams against {roots[0]}...")
+        problems = verify_all(jobs, args.jobs, options)
+        print(f"\n{problems} of {len(jobs)} diagrams differ" if problems else "\nAll outputs are byte-identical")
+        return 1 if problems else 0
+    
+    if args.watch:
+        return watch_build(args, options)
     
-    base_path = '/workspaces/Learn/assets/images/mod1'
-    
-    for lesson in ['lesson01', 'lesson02', 'lesson03']:
-        image_dir = os.path.join(base_path, lesson)
-        thumb_dir = os.path.join(image_dir, 'thumbnails')
-        os.makedirs(thumb_dir, exist_ok=True)
-        
-        webp_files = glob.glob(os.path.join(image_dir, '*.webp'))
-        
-        for webp_file in webp_files:
-            filename = os.path.basename(webp_file)
-            thumb_path = os.path.join(thumb_dir, filename.replace('.webp', '-thumb.webp'))
-            
-            try:
-                img = Image.open(webp_file)
-                img.thumbnail((200, 150), Image.Resampling.LANCZOS)
-                img.save(thumb_path, 'WEBP', quality=75)
-                print(f"Created thumbnail: {thumb_path}")
-            except Exception as e:
-                print(f"Error creating thumbnail for {webp_file}: {e}")
-
-def main():
     print("Creating educational diagrams for HSC Biology Module 1...")
-    
-    # Lesson 1 images
-    print("Creating Lesson 1 images...")
-    create_prokaryote_diagram()
-    create_nucleoid_tem()
-    create_70s_ribosome()
-    create_flagella_sem()
-    
-    # Lesson 2 images
-    print("Creating Lesson 2 images...")
-    create_nucleus_diagram()
-    create_nucleus_tem()
-    create_er_rough()
-    create_nucleolus_diagram()
-    
-    # Lesson 3 images
-    print("Creating Lesson 3 images...")
-    create_lm_vs_tem()
-    create_sem_pollen()
-    create_tem_mitochondria()
-    create_light_microscope()
-    create_scale_bar_example()
-    
-    # Create thumbnails
-    print("Creating thumbnails...")
-    create_thumbnails()
-    
-    print("\nAll images created successfully!")
+    cache = BuildCache(roots[0], enabled=not args.force, mirrors=roots[1:])
+    failures, _ = build(jobs, args.jobs, cache, options)
+    if not failures:
+        print("\nAll images created successfully!")
     
     # Print file sizes
     import glob
-    base_path = '/workspaces/Learn/assets/images/mod1'
-    for lesson in ['lesson01', 'lesson02', 'lesson03']:
+    base_path = roots[0]
+    for lesson in sorted({f"lesson{job.lesson:02d}" for job in jobs}):
         print(f"\n{lesson}:")
-        for webp_file in glob.glob(os.path.join(base_path, lesson, '*.webp')):
-            size_kb = os.path.getsize(webp_file) / 1024
-            print(f"  {os.path.basename(webp_file)}: {size_kb:.1f} KB")
+        for image_file in sorted(glob.glob(os.path.join(base_path, lesson, '*.webp')) +
+                                 glob.glob(os.path.join(base_path, lesson, '*.png')) +
+                                 glob.glob(os.path.join(base_path, lesson, '*.svg'))):
+            size_kb = os.path.getsize(image_file) / 1024
+            print(f"  {os.path.basename(image_file)}: {size_kb:.1f} KB")
+    
+    return 1 if failures else 0
 
 if __name__ == '__main__':
-    main()
+    sys.exit(main())
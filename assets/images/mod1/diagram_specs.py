@@ -0,0 +1,127 @@
+"""
+Declarative diagram specs for the Module 1 generator
+A spec is a JSON file describing canvas size, background, drawing primitives
+and labels; one interpreter draws every spec into a display list, so new
+lesson diagrams need no Python of their own.
+
+Spec layout:
+    {
+      "output": "lesson01/70s-ribosome.webp",
+      "size": [300, 300],
+      "background": "#f8fafc",
+      "encode": {"quality": 85},
+      "tags": ["line-art"],
+      "primitives": [
+        {"type": "ellipse", "xy": [x1, y1, x2, y2], "fill": "#dbeafe", "outline": "#3b82f6", "width": 3},
+        {"type": "scatter", "points": [[x, y], ...], "radius": 6, "fill": "#10b981"}
+      ],
+      "labels": [
+        {"text": "Nucleoid", "xy": [x, y], "fill": "#1e293b", "style": "label",
+         "leader": [[x1, y1], [x2, y2]]},
+        {"text": "Flagellum", "anchor": [x, y], "xy": [x, y], "note": "(rotary motor)"}
+      ]
+    }
+
+"tags" select the spec on the command line (--tag); "line-art" marks pure
+vector drawings that --svg may also export as a vector file. Labels and text
+primitives take a "style" from fonts.STYLES (title, label, caption,
+scale-bar; default label). A label with an "anchor" (the point it names) is
+a callout: label_layout places it, starting from "xy" if given, and draws
+its leader, so it needs no "leader" of its own.
+"""
+
+import glob
+import json
+import os
+
+from fonts import STYLES
+
+SPEC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'specs')
+
+# Parsed specs keyed by path, invalidated by modification time
+_spec_cache = {}
+
+class SpecError(ValueError):
+    """Raised when a spec file is malformed"""
+
+def load_spec(path):
+    """Parse a spec file once and reuse it until the file changes"""
+    path = os.path.abspath(path)
+    mtime = os.stat(path).st_mtime_ns
+    cached = _spec_cache.get(path)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    with open(path, encoding='utf-8') as f:
+        try:
+            spec = json.load(f)
+        except ValueError as e:
+            raise SpecError(f"{path}: {e}") from e
+    for field in ('output', 'size', 'primitives'):
+        if field not in spec:
+            raise SpecError(f"{path}: missing '{field}'")
+    _spec_cache[path] = (mtime, spec)
+    return spec
+
+def discover_specs(spec_dir=SPEC_DIR):
+    """All spec files under spec_dir, in lesson order"""
+    return sorted(glob.glob(os.path.join(spec_dir, 'lesson*', '*.json')))
+
+def _draw_scatter(draw, prim):
+    radius = prim.get('radius', 3)
+    rx, ry = radius if isinstance(radius, (list, tuple)) else (radius, radius)
+    for x, y in prim['points']:
+        draw.ellipse([x-rx, y-ry, x+rx, y+ry], fill=prim.get('fill'), outline=prim.get('outline'))
+
+def _style(item):
+    style = item.get('style', 'label')
+    if style not in STYLES:
+        raise SpecError(f"unknown text style: {style!r}")
+    return style
+
+def draw_primitive(draw, prim):
+    """Draw one spec primitive onto an ImageDraw-like surface"""
+    kind = prim.get('type')
+    fill, outline, width = prim.get('fill'), prim.get('outline'), prim.get('width', 1)
+    if kind in ('ellipse', 'rectangle'):
+        getattr(draw, kind)(prim['xy'], fill=fill, outline=outline, width=width)
+    elif kind == 'rounded_rectangle':
+        draw.rounded_rectangle(prim['xy'], radius=prim.get('radius', 0),
+                               fill=fill, outline=outline, width=width)
+    elif kind == 'arc':
+        draw.arc(prim['xy'], start=prim['start'], end=prim['end'], fill=fill, width=width)
+    elif kind == 'pieslice':
+        draw.pieslice(prim['xy'], start=prim['start'], end=prim['end'],
+                      fill=fill, outline=outline, width=width)
+    elif kind == 'polygon':
+        draw.polygon([tuple(p) for p in prim['points']], fill=fill, outline=outline)
+    elif kind == 'line':
+        draw.line([tuple(p) for p in prim['points']], fill=fill, width=width)
+    elif kind == 'text':
+        draw.text(tuple(prim['xy']), prim['text'], fill=fill, style=_style(prim))
+    elif kind == 'scatter':
+        _draw_scatter(draw, prim)
+    else:
+        raise SpecError(f"unknown primitive type: {kind!r}")
+
+def draw_label(draw, label):
+    """Draw a label and its optional leader line, or record a callout"""
+    if 'anchor' in label:
+        draw.label(tuple(label['anchor']), label['text'], near=tuple(label['xy']) if 'xy' in label else None,
+                   fill=label.get('fill', '#1e293b'), style=_style(label), note=label.get('note'))
+        return
+    if 'leader' in label:
+        draw.line([tuple(p) for p in label['leader']],
+                  fill=label.get('leader_fill', label.get('fill', '#1e293b')),
+                  width=label.get('leader_width', 2))
+    draw.text(tuple(label['xy']), label['text'], fill=label.get('fill', '#1e293b'), style=_style(label))
+
+def draw_spec(draw, spec):
+    """Draw a parsed spec's primitives and labels onto draw"""
+    for prim in spec['primitives']:
+        draw_primitive(draw, prim)
+    for label in spec.get('labels', []):
+        draw_label(draw, label)
+
+def draw_spec_file(draw, spec_path):
+    """Draw the spec at spec_path (relative to SPEC_DIR or absolute)"""
+    draw_spec(draw, load_spec(os.path.join(SPEC_DIR, spec_path)))
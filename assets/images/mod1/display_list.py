@@ -0,0 +1,173 @@
+"""
+Display lists for the Module 1 diagram generator
+Generators draw into a RecordingDraw, which has the ImageDraw surface they use
+(ellipse, arc, pieslice, polygon, rectangle, rounded_rectangle, line, point,
+text, which also takes style= naming a fonts.STYLES entry), stamp() for many
+copies of one small shape, label() for callouts that label_layout places
+automatically, and layer() for raster effects such as the NumPy textures.
+The captured DisplayList can then be replayed at any scale, into any
+backend, any number of times.
+"""
+
+import functools
+
+from PIL import Image, ImageDraw, ImageFont
+
+import fonts
+import stamps
+
+# Pillow's default text size and multiline spacing, scaled with the drawing
+DEFAULT_FONT_SIZE = 10
+DEFAULT_SPACING = 4
+
+DRAW_METHODS = ('arc', 'ellipse', 'line', 'pieslice', 'point', 'polygon',
+                'rectangle', 'rounded_rectangle', 'text')
+
+class DisplayList:
+    """Canvas size, background and the ordered drawing operations of a diagram.
+
+    Each op is (method, args, kwargs); layer ops store the callable as the
+    first argument.
+    """
+
+    def __init__(self, size, background):
+        self.size = tuple(size)
+        self.background = background
+        self.ops = []
+
+    def __len__(self):
+        return len(self.ops)
+
+class RecordingDraw:
+    """ImageDraw-compatible proxy that records every call into a DisplayList"""
+
+    def __init__(self, size, background):
+        self.display_list = DisplayList(size, background)
+
+    def _record(self, method, args, kwargs):
+        self.display_list.ops.append((method, args, kwargs))
+
+    def stamp(self, shape, xs, ys, radius, **kwargs):
+        """Record one shape ('ellipse' or 'rectangle') of radius r or (rx, ry)
+        centred on every point of the coordinate arrays xs, ys; kwargs are
+        fill, outline and width as for ImageDraw"""
+        self._record('stamp', (shape, xs, ys, radius), kwargs)
+
+    def layer(self, fn, *args, **kwargs):
+        """Record a raster effect; replay calls fn(image, *args, scale=s, **kwargs)"""
+        self._record('layer', (fn, *args), kwargs)
+
+    def label(self, anchor, text, near=None, fill='#1e293b', style='label', note=None,
+              note_fill='#64748b', leader_width=2):
+        """Record a callout naming the feature at anchor. label_layout.resolve
+        picks its position (near is the preferred top-left corner) and draws
+        a leader_width leader back to the anchor; note is an optional
+        caption-style second line."""
+        self._record('label', (tuple(anchor), text),
+                     {'near': near, 'fill': fill, 'style': style, 'note': note,
+                      'note_fill': note_fill, 'leader_width': leader_width})
+
+def _recorder(method):
+    def record(self, *args, **kwargs):
+        self._record(method, args, kwargs)
+    record.__name__ = method
+    record.__doc__ = f"Record ImageDraw.{method}"
+    return record
+
+for _method in DRAW_METHODS:
+    setattr(RecordingDraw, _method, _recorder(_method))
+
+def scaled(value, scale):
+    """Scale a coordinate, or a (possibly nested) sequence of coordinates"""
+    if scale == 1:
+        return value
+    if isinstance(value, (list, tuple)):
+        return type(value)(scaled(v, scale) for v in value)
+    return value * scale
+
+def _flat_points(xy):
+    """[(x, y), ...] or [x, y, ...] -> [(x, y), ...]"""
+    if xy and isinstance(xy[0], (list, tuple)):
+        return [tuple(p) for p in xy]
+    return list(zip(xy[0::2], xy[1::2]))
+
+@functools.lru_cache(maxsize=32)
+def default_font(size):
+    """Pillow's default font at size, loaded once per size per process"""
+    return ImageFont.load_default(size=size)
+
+class RasterBackend:
+    """Replays ops onto a new Pillow image at the given scale"""
+
+    def __init__(self, size, background, scale=1, mode='RGB'):
+        self.scale = scale
+        self.image = Image.new(mode, (round(size[0] * scale), round(size[1] * scale)), background)
+        self.draw = ImageDraw.Draw(self.image)
+
+    def _kwargs(self, kwargs):
+        s = self.scale
+        if s == 1:
+            return kwargs
+        kwargs = dict(kwargs)
+        if 'width' in kwargs:
+            kwargs['width'] = max(1, round(kwargs['width'] * s))
+        if 'radius' in kwargs:
+            kwargs['radius'] = kwargs['radius'] * s
+        return kwargs
+
+    def text(self, xy, text, style=None, **kwargs):
+        if style is not None:
+            fonts.draw_text(self.image, scaled(xy, self.scale), text, style, self.scale, kwargs.get('fill'))
+            return
+        if self.scale != 1:
+            kwargs = dict(kwargs)
+            if kwargs.get('font') is None:
+                kwargs['font'] = default_font(DEFAULT_FONT_SIZE * self.scale)
+            kwargs['spacing'] = kwargs.get('spacing', DEFAULT_SPACING) * self.scale
+        self.draw.text(tuple(scaled(xy, self.scale)), text, **kwargs)
+
+    def point(self, xy, fill=None):
+        s = self.scale
+        if s == 1:
+            self.draw.point(xy, fill=fill)
+            return
+        # A point covers an s-by-s block at higher resolutions
+        points = [xy] if not isinstance(xy[0], (list, tuple)) and len(xy) == 2 else _flat_points(xy)
+        for x, y in points:
+            self.draw.rectangle([x * s, y * s, x * s + s - 1, y * s + s - 1], fill=fill)
+
+    def stamp(self, shape, xs, ys, radius, **kwargs):
+        stamps.stamp_shapes(self.image, shape, xs, ys, radius, scale=self.scale, **self._kwargs(kwargs))
+
+    def layer(self, fn, *args, **kwargs):
+        fn(self.image, *args, scale=self.scale, **kwargs)
+
+    def leader(self, xy, **kwargs):
+        """A label's leader line, drawn with the labels"""
+        self.line(xy, **kwargs)
+
+    def __getattr__(self, method):
+        if method not in DRAW_METHODS:
+            raise AttributeError(method)
+        draw_method = getattr(self.draw, method)
+
+        def replay(xy, *args, **kwargs):
+            draw_method(scaled(xy, self.scale), *args, **self._kwargs(kwargs))
+        return replay
+
+def replay(display_list, backend):
+    """Send every op of display_list to backend, in order"""
+    for method, args, kwargs in display_list.ops:
+        getattr(backend, method)(*args, **kwargs)
+    return backend
+
+def render(display_list, scale=1):
+    """Rasterize a display list at scale and return the image"""
+    backend = RasterBackend(display_list.size, display_list.background, scale)
+    return replay(display_list, backend).image
+
+def capture(func, size, background, *args, **kwargs):
+    """Record func(draw, *args, **kwargs) and return its display list"""
+    draw = RecordingDraw(size, background)
+    func(draw, *args, **kwargs)
+    return draw.display_list
@@ -0,0 +1,399 @@
+"""
+Responsive output encoding for the Module 1 diagram generator
+Turns one in-memory render into a 1x/2x/thumbnail set plus optional AVIF/JPEG
+fallbacks, and records widths and byte sizes in a per-lesson sidecar JSON
+(images.json) that assets/js/image-manager.js uses for srcset entries. The
+sidecar also carries a tiny inline placeholder and the dominant colour, which
+assets/js/lesson-renderer.js paints while the full image downloads, and any
+theme variants (themes.py) with the media query that selects them.
+WebP variants keep their configured quality (or go lossless when smaller)
+unless a byte budget forces it lower, never below a PSNR floor; indexed (mode "P") renders are written
+losslessly as WebP or optimized PNG, whichever is smaller.
+"""
+
+import base64
+import io
+import json
+import math
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image, ImageFilter, features
+
+from themes import THEMES, apply_theme
+
+SIDECAR_NAME = 'images.json'
+
+# The <100KB per image promise, and the quality floor the search may not cross:
+# at 40 dB the shaded SEM plates showed blocking on their smooth gradients
+DEFAULT_BUDGET = 100 * 1024
+DEFAULT_MIN_PSNR = 42.0
+MIN_QUALITY = 40
+
+# Lossless WebP effort cap: method 6 took 20x as long as 4 for the same
+# bytes on these diagrams, and 1 takes a third less time than 3 for sizes
+# within a few percent either way
+LOSSLESS_METHOD = 1
+
+THUMBNAIL_SIZE = (200, 150)
+THUMBNAIL_ENCODE = {'format': 'WEBP', 'quality': 75}
+
+# Inline low-quality placeholder (a few hundred bytes of base64) and the
+# palette size used to pick the dominant colour
+PLACEHOLDER_WIDTH = 16
+PLACEHOLDER_ENCODE = {'format': 'WEBP', 'quality': 40}
+DOMINANT_COLORS = 8
+
+# Lossless encodings tried for indexed renders (see palette.py); with PNG
+# the primary variant is written as .png instead of the job's .webp
+INDEXED_FORMATS = ('WEBP', 'PNG')
+
+# Extra formats that can be requested with --fallbacks
+FALLBACK_ENCODE = {
+    'avif': {'format': 'AVIF', 'quality': 60},
+    'jpeg': {'format': 'JPEG', 'quality': 85, 'optimize': True, 'progressive': True},
+}
+
+# mkstemp creates 0600 files; published files get the usual umask-derived mode
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+FILE_MODE = 0o666 & ~_UMASK
+
+MIME_TYPES = {'WEBP': 'image/webp', 'AVIF': 'image/avif', 'JPEG': 'image/jpeg', 'PNG': 'image/png',
+              'SVG': 'image/svg+xml'}
+EXTENSIONS = {'WEBP': '.webp', 'AVIF': '.avif', 'JPEG': '.jpg', 'PNG': '.png', 'SVG': '.svg'}
+
+def available_fallbacks():
+    """Fallback formats this Pillow build can encode"""
+    names = ['jpeg']
+    if features.check('avif'):
+        names.insert(0, 'avif')
+    return names
+
+def encode(img, settings):
+    """Encode img in memory and return the bytes"""
+    if settings['format'] == 'JPEG' and img.mode not in ('RGB', 'L'):
+        img = img.convert('RGB')
+    elif img.mode == 'P' and settings['format'] != 'PNG' and not settings.get('lossless'):
+        # Lossy codecs work on full colour anyway
+        img = img.convert('RGB')
+    buffer = io.BytesIO()
+    img.save(buffer, **settings)
+    return buffer.getvalue()
+
+class BudgetError(ValueError):
+    """Raised when no encoding fits the byte budget at the quality floor"""
+
+def psnr(reference, data):
+    """Peak signal-to-noise ratio (dB) of encoded bytes against the source image"""
+    decoded = Image.open(io.BytesIO(data)).convert('RGB')
+    a = np.asarray(reference.convert('RGB'), dtype=np.float32)
+    b = np.asarray(decoded, dtype=np.float32)
+    mse = float(np.mean((a - b) ** 2))
+    return math.inf if mse == 0 else 10 * math.log10(255 ** 2 / mse)
+
+def lossless_settings(settings):
+    """Lossless WebP settings derived from settings, effort capped at
+    LOSSLESS_METHOD"""
+    extra = {k: v for k, v in settings.items() if k not in ('format', 'quality', 'lossless', 'method')}
+    return {**extra, 'format': 'WEBP', 'lossless': True, 'quality': 100,
+            'method': min(settings.get('method', LOSSLESS_METHOD), LOSSLESS_METHOD)}
+
+def encode_within_budget(img, settings, budget=DEFAULT_BUDGET, min_psnr=DEFAULT_MIN_PSNR, reuse=None):
+    """WebP encoding of img within budget bytes and min_psnr, lowering the
+    configured quality only as far as the budget requires.
+
+    Lossless and lossy at the configured quality are tried first; the smaller
+    one that fits budget (and, if lossy, min_psnr) wins. Only when neither
+    fits does a binary search between MIN_QUALITY and the configured quality
+    find the highest lossy quality within budget. reuse is the report of a
+    sibling variant already searched (the @2x render of the same drawing);
+    its choice is encoded first and kept if it fits. Returns (bytes, report)
+    where report records the choice. Raises BudgetError if the chosen lossy
+    encoding misses min_psnr, or if nothing fits the budget.
+    """
+    if settings['format'] != 'WEBP':
+        return encode(img, settings), {}
+
+    lossy = {k: v for k, v in settings.items() if k not in ('quality', 'lossless')}
+    encoded = {}
+    scores = {}
+
+    def encode_at(quality):
+        """Lossy bytes at quality, or lossless bytes for None, encoded once"""
+        if quality not in encoded:
+            encoded[quality] = encode(img, lossless_settings(settings) if quality is None
+                                      else {**lossy, 'quality': quality})
+        return encoded[quality]
+
+    def score_at(quality):
+        if quality not in scores:
+            scores[quality] = psnr(img, encode_at(quality))
+        return scores[quality]
+
+    def fits(quality):
+        return len(encode_at(quality)) <= budget and (quality is None or score_at(quality) >= min_psnr)
+
+    def result(quality):
+        if quality is None:
+            return encode_at(None), {'lossless': True, 'psnr': None}
+        score = score_at(quality)
+        if score < min_psnr:
+            raise BudgetError(f"quality {quality} ({len(encode_at(quality))} bytes) reaches "
+                              f"{score:.2f} dB, below the {min_psnr} dB floor")
+        return encode_at(quality), {'quality': quality, 'lossless': False,
+                                    'psnr': None if math.isinf(score) else round(score, 2)}
+
+    if reuse and (reuse.get('lossless') or 'quality' in reuse):
+        choice = None if reuse.get('lossless') else reuse['quality']
+        if fits(choice):
+            return result(choice)
+
+    # Flat-colour diagrams often compress better losslessly (ties go lossless)
+    quality = settings.get('quality', 85)
+    for choice in sorted((None, quality), key=lambda q: len(encode_at(q))):
+        if fits(choice):
+            return result(choice)
+    if len(encode_at(quality)) <= budget:
+        # Within budget but under the floor, which result reports
+        return result(quality)
+
+    # Size grows with quality: find the highest quality that still fits
+    low, high, best = MIN_QUALITY, quality - 1, None
+    while low <= high:
+        mid = (low + high) // 2
+        if len(encode_at(mid)) <= budget:
+            best, low = mid, mid + 1
+        else:
+            high = mid - 1
+    if best is None:
+        raise BudgetError(f"{len(encode_at(MIN_QUALITY))} bytes at quality {MIN_QUALITY} exceeds "
+                          f"budget of {budget} bytes")
+    return result(best)
+
+def encode_indexed(img, settings, budget=DEFAULT_BUDGET):
+    """Smallest lossless encoding of an indexed img among INDEXED_FORMATS.
+
+    WebP uses lossless_settings(settings). Returns (bytes, settings used,
+    report); raises BudgetError if it is over budget.
+    """
+    candidates = {
+        'WEBP': lossless_settings(settings),
+        'PNG': {'format': 'PNG', 'optimize': True},
+    }
+    best = None
+    for fmt in INDEXED_FORMATS:
+        data = encode(img, candidates[fmt])
+        if best is None or len(data) < len(best[0]):
+            best = (data, candidates[fmt])
+    data, chosen = best
+    if len(data) > budget:
+        raise BudgetError(f"{len(data)} bytes exceeds budget of {budget} bytes losslessly indexed")
+    return data, chosen, {'lossless': True, 'colors': len(img.getpalette()) // 3}
+
+def remove(roots, rel_path):
+    """Delete rel_path under every root where it exists"""
+    for root in roots:
+        path = os.path.join(root, rel_path)
+        if os.path.exists(path):
+            os.unlink(path)
+
+def write_bytes(path, data):
+    """Write data to path atomically: readers see the old file or the new one,
+    never a partial write"""
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.chmod(tmp_path, FILE_MODE)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+def mirror_file(src, dst):
+    """Hard-link src to dst (copying across filesystems), replacing dst atomically"""
+    directory = os.path.dirname(dst)
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = os.path.join(directory, f".{os.path.basename(dst)}.{os.getpid()}.tmp")
+    try:
+        try:
+            os.link(src, tmp_path)
+        except OSError:
+            shutil.copyfile(src, tmp_path)
+        os.replace(tmp_path, dst)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+def publish(roots, rel_path, data):
+    """Write data under the first root and mirror it into the others"""
+    primary = os.path.join(roots[0], rel_path)
+    write_bytes(primary, data)
+    for root in roots[1:]:
+        mirror_file(primary, os.path.join(root, rel_path))
+
+def variant_path(output, suffix='', fmt='WEBP'):
+    """lesson01/nucleus.webp -> lesson01/nucleus{suffix}{ext}"""
+    stem, _ = os.path.splitext(output)
+    return f"{stem}{suffix}{EXTENSIONS[fmt]}"
+
+def variant_paths(output):
+    """Every file write_variants can produce for output except the thumbnail:
+    each format at 1x and 2x, plain and in every theme"""
+    suffixes = ['', '@2x'] + [f"-{name}{density}" for name in THEMES for density in ('', '@2x')]
+    return [variant_path(output, suffix, fmt) for suffix in suffixes for fmt in EXTENSIONS]
+
+def make_thumbnail(img):
+    # Resampling an indexed image would fall back to nearest neighbour
+    thumb = img.convert('RGB') if img.mode == 'P' else img.copy()
+    thumb.thumbnail(THUMBNAIL_SIZE, Image.Resampling.LANCZOS)
+    return thumb
+
+def make_placeholder(img):
+    """Blurred PLACEHOLDER_WIDTH-wide copy of img as a data: URI"""
+    height = max(1, round(img.height * PLACEHOLDER_WIDTH / img.width))
+    tiny = img.convert('RGB').resize((PLACEHOLDER_WIDTH, height), Image.Resampling.BOX)
+    data = encode(tiny.filter(ImageFilter.GaussianBlur(1)), PLACEHOLDER_ENCODE)
+    return f"data:{MIME_TYPES[PLACEHOLDER_ENCODE['format']]};base64,{base64.b64encode(data).decode('ascii')}"
+
+def dominant_color(img):
+    """Most common colour of img reduced to DOMINANT_COLORS colours, as #rrggbb"""
+    reduced = img.convert('RGB').quantize(DOMINANT_COLORS)
+    _, index = max(reduced.getcolors())
+    r, g, b = reduced.getpalette()[index * 3:index * 3 + 3]
+    return f"#{r:02x}{g:02x}{b:02x}"
+
+def _entry(output, img, data, settings, density=None):
+    entry = {
+        'src': os.path.basename(output),
+        'width': img.width,
+        'height': img.height,
+        'bytes': len(data),
+        'type': MIME_TYPES[settings['format']],
+    }
+    if density:
+        entry['density'] = density
+    return entry
+
+def write_variants(roots, output, img, encode_settings, img_2x=None, fallbacks=(),
+                   budget=DEFAULT_BUDGET, min_psnr=DEFAULT_MIN_PSNR, sink=None, timings=None,
+                   svg=None, themes=()):
+    """Encode and write every variant of one render under each output root.
+
+    img is the 1x render and img_2x an optional render at twice the size;
+    indexed renders are encoded with encode_indexed, so their primary-format
+    variants may become PNG files. When writing to disk, variants an earlier
+    build wrote but this one does not (a WebP now encoded as PNG, a dropped
+    @2x, fallback, SVG or theme) are removed, so the manifest, which lists
+    the files on disk, only sees this build's output.
+    svg is an optional SVG document of the same drawing; it is listed first
+    so browsers prefer it over the rasters. themes names THEMES entries to
+    write as recoloured copies of the primary-format variants
+    (nucleus-dark.webp, nucleus-dark@2x.webp).
+    The primary-format variants are held to budget bytes each; the quality
+    search runs once, on the largest render, and the other variants start
+    from its choice. sink(rel_path,
+    data) replaces the disk writes, e.g. to verify bytes in memory. If timings
+    is a dict, seconds spent in the 'encode' and 'thumbnail' stages are added.
+    Returns the sidecar entry describing what was written, including the
+    placeholder and dominant colour computed from the thumbnail.
+    """
+    start = time.perf_counter()
+    publishing = sink is None
+    if sink is None:
+        def sink(rel_path, data):
+            publish(roots, rel_path, data)
+    files = []
+    if svg is not None:
+        svg_path = variant_path(output, '', 'SVG')
+        sink(svg_path, svg)
+        files.append(_entry(svg_path, img, svg, {'format': 'SVG'}))
+
+    def emit(suffix, image, settings, density=None, files=files, encoded=None, reuse=None):
+        if settings is encode_settings and image.mode == 'P':
+            data, settings, report = encode_indexed(image, settings, budget)
+        elif settings is encode_settings:
+            data, report = encoded or encode_within_budget(image, settings, budget, min_psnr, reuse)
+        else:
+            data, report = encode(image, settings), {}
+        path = variant_path(output, suffix, settings['format'])
+        sink(path, data)
+        files.append({**_entry(path, image, data, settings, density), **report})
+        return files[-1]
+
+    # Search the largest render once; the 1x and theme variants start from
+    # its choice instead of repeating the search
+    encoded_2x = reuse = None
+    if img_2x is not None and img_2x.mode != 'P':
+        encoded_2x = encode_within_budget(img_2x, encode_settings, budget, min_psnr)
+        reuse = encoded_2x[1]
+    primary = emit('', img, encode_settings, density=1, reuse=reuse)
+    reuse = reuse or primary
+    if img_2x is not None:
+        emit('@2x', img_2x, encode_settings, density=2, encoded=encoded_2x)
+    for name in fallbacks:
+        settings = FALLBACK_ENCODE[name]
+        emit('', img, settings, density=1)
+        if img_2x is not None:
+            emit('@2x', img_2x, settings, density=2)
+    themed = {}
+    for name in themes:
+        theme = THEMES[name]
+        themed[name] = {'media': theme.media, 'variants': []}
+        emit(f"-{name}", apply_theme(img, theme), encode_settings, 1, themed[name]['variants'], reuse=reuse)
+        if img_2x is not None:
+            emit(f"-{name}@2x", apply_theme(img_2x, theme), encode_settings, 2, themed[name]['variants'],
+                 reuse=reuse)
+
+    thumb_start = time.perf_counter()
+    # Downscale the largest render we have for the sharpest thumbnail
+    thumb = make_thumbnail(img_2x if img_2x is not None else img)
+    data = encode(thumb, THUMBNAIL_ENCODE)
+    thumb_path = variant_path(output, '-thumb', THUMBNAIL_ENCODE['format'])
+    sink(thumb_path, data)
+    placeholder, color = make_placeholder(thumb), dominant_color(thumb)
+    if publishing:
+        written = {f['src'] for f in files} | {f['src'] for t in themed.values() for f in t['variants']}
+        for path in variant_paths(output):
+            if os.path.basename(path) not in written:
+                remove(roots, path)
+    if timings is not None:
+        timings['encode'] = timings.get('encode', 0.0) + thumb_start - start
+        timings['thumbnail'] = timings.get('thumbnail', 0.0) + time.perf_counter() - thumb_start
+
+    entry = {
+        'width': img.width,
+        'height': img.height,
+        'variants': files,
+        'thumbnail': _entry(thumb_path, thumb, data, THUMBNAIL_ENCODE),
+        'placeholder': placeholder,
+        'color': color,
+    }
+    if themed:
+        entry['themes'] = themed
+    return entry
+
+def update_sidecars(roots, entries):
+    """Merge {output: entry} into each lesson's images.json, keyed by image name"""
+    by_dir = {}
+    for output, entry in entries.items():
+        by_dir.setdefault(os.path.dirname(output), {})[
+            os.path.splitext(os.path.basename(output))[0]] = entry
+
+    for lesson_dir, updates in by_dir.items():
+        rel_path = os.path.join(lesson_dir, SIDECAR_NAME)
+        path = os.path.join(roots[0], rel_path)
+        sidecar = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                sidecar = json.load(f)
+        sidecar.update(updates)
+        publish(roots, rel_path, (json.dumps(sidecar, indent=2, sort_keys=True) + '\n').encode('utf-8'))
@@ -0,0 +1,92 @@
+"""
+Text styles for the Module 1 diagram generator
+Labels name a style (title, label, caption, scale-bar) instead of passing a
+font. Each style is a TrueType face at a pixel size. The faces are DejaVu
+Sans files committed under typefaces/ and loaded by path, so output bytes do
+not depend on the fonts a machine has installed. Faces are loaded once per
+process per (face, size), so @2x and on-demand renders get real glyphs at
+their own size. Rendered text (coverage mask and offset) and bounding boxes
+are cached per (style, text, scale), so repeated strings such as "0.5 µm"
+are laid out once.
+"""
+
+import functools
+import math
+import os
+from collections import namedtuple
+
+from PIL import Image, ImageDraw, ImageFont
+
+from build_cache import file_digest, make_key
+
+FONT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'typefaces')
+
+# Font file per face, under FONT_DIR
+FACES = {
+    'regular': 'DejaVuSans.ttf',
+    'bold': 'DejaVuSans-Bold.ttf',
+}
+
+TextStyle = namedtuple('TextStyle', 'face size spacing')
+
+STYLES = {
+    'title': TextStyle('bold', 18, 4),
+    'label': TextStyle('regular', 13, 3),
+    'caption': TextStyle('regular', 11, 3),
+    'scale-bar': TextStyle('bold', 12, 3),
+}
+
+LAYOUT_CACHE_SIZE = 1024
+
+def face_path(face):
+    return os.path.join(FONT_DIR, FACES[face])
+
+@functools.lru_cache(maxsize=64)
+def load_font(face, size):
+    """The TrueType font for face at size pixels, loaded once per process"""
+    return ImageFont.truetype(face_path(face), size)
+
+def font(style, scale=1):
+    """The font for a named style at scale"""
+    face, size, _ = STYLES[style]
+    return load_font(face, max(1, round(size * scale)))
+
+def spacing(style, scale=1):
+    return STYLES[style].spacing * scale
+
+@functools.lru_cache(maxsize=None)
+def fingerprint():
+    """Hash of the face files' contents and the styles"""
+    return make_key({face: file_digest(face_path(face)) for face in FACES},
+                    {name: tuple(style) for name, style in STYLES.items()})
+
+# Scratch surface for measuring text
+_MEASURE = ImageDraw.Draw(Image.new('L', (1, 1)))
+
+@functools.lru_cache(maxsize=LAYOUT_CACHE_SIZE)
+def text_bbox(style, text, scale=1):
+    """(left, top, right, bottom) of text drawn at (0, 0) in style at scale"""
+    return _MEASURE.multiline_textbbox((0, 0), text, font=font(style, scale),
+                                      spacing=spacing(style, scale))
+
+@functools.lru_cache(maxsize=LAYOUT_CACHE_SIZE)
+def layout(style, text, scale=1, start=(0.0, 0.0)):
+    """(coverage mask, (dx, dy)) of text in style at scale.
+
+    Pasting the fill colour through the mask at the text position plus
+    (dx, dy) gives the same pixels as ImageDraw.text; start is the
+    fractional part of the position, which shifts glyph rasterization.
+    """
+    left, top, right, bottom = text_bbox(style, text, scale)
+    dx, dy = min(0, math.floor(left)), min(0, math.floor(top))
+    mask = Image.new('L', (math.ceil(right) - dx + 1, math.ceil(bottom) - dy + 1))
+    ImageDraw.Draw(mask).text((start[0] - dx, start[1] - dy), text, fill=255,
+                              font=font(style, scale), spacing=spacing(style, scale))
+    return mask, (dx, dy)
+
+def draw_text(img, xy, text, style, scale=1, fill=None):
+    """Draw text onto img in style at scale; xy is in img's pixels"""
+    x, y = xy
+    # Mirrors ImageDraw.text: integer origin plus a fractional glyph offset
+    mask, (dx, dy) = layout(style, text, scale, (math.modf(x)[0], math.modf(y)[0]))
+    img.paste(fill if fill is not None else 'white', (int(x) + dx, int(y) + dy), mask)
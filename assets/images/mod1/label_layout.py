@@ -0,0 +1,308 @@
+"""
+Automatic label placement for the Module 1 diagram generator
+Generators record callouts with draw.label(anchor, text, near=...): the
+feature being named and, optionally, where the label would ideally sit.
+resolve() then places every label before the diagram is rendered. Candidate
+boxes around the anchor are scored against summed-area tables of the base
+layer (busy pixels such as edges, outlines and textures, and any pixel that
+is not plain background) and a uniform grid of the boxes already taken by
+text and leaders; a candidate may not leave the canvas, cover another label
+or leader, or sit on the structures it names, and its leader is charged for
+the shapes it crosses. Each placed label becomes text ops plus a leader line
+from its anchor, all in the labels layer, and its leader is marked in the
+grid and tables before the next label is placed.
+"""
+
+import math
+from collections import defaultdict, namedtuple
+
+import numpy as np
+
+from PIL import ImageColor
+
+import fonts
+import layers
+from display_list import DisplayList
+
+# Pixels kept clear around labels and the canvas edge
+LABEL_MARGIN = 4
+CANVAS_MARGIN = 6
+
+# Candidate positions: rings around the anchor, DIRECTIONS per ring
+RING_GAPS = (12, 30, 55, 85, 120, 160, 210)
+DIRECTIONS = 16
+
+# A neighbouring pixel difference above this marks a pixel as busy
+BUSY_THRESHOLD = 40
+
+# Score weights: covering another label or leader, or a box more than
+# MAX_BUSY busy or MAX_COVER covered, is effectively forbidden; below those,
+# busy pixels are to be avoided, open canvas beats sitting on a filled shape,
+# and distance from the preferred spot breaks ties
+TEXT_OVERLAP_COST = 1e6
+BUSY_COST = 4000
+COVER_COST = 400
+DISTANCE_COST = 1.0
+MAX_BUSY = 0.001
+MAX_COVER = 0.01
+
+# Per pixel of leader: crossing edges costs more than running over a fill.
+# The first LEADER_CLEARANCE pixels sit on the named feature and are free.
+LEADER_BUSY_COST = 12
+LEADER_COVER_COST = 1.5
+LEADER_CLEARANCE = 6
+
+# Leaders shorter than this are not drawn; longer ones are marked in the
+# grid as boxes along pieces of at most LEADER_PIECE pixels
+MIN_LEADER = 8
+LEADER_PIECE = 8
+
+GRID_CELL = 32
+
+Label = namedtuple('Label', 'anchor text near fill style note note_fill leader_width')
+
+# Busy and covered pixel masks of a base layer and their summed-area tables
+PixelTables = namedtuple('PixelTables', 'busy covered busy_sum covered_sum')
+
+class BoxGrid:
+    """Uniform grid over axis-aligned boxes for fast overlap queries"""
+
+    def __init__(self, cell=GRID_CELL):
+        self.cell = cell
+        self.boxes = []
+        self._cells = defaultdict(list)
+
+    def _span(self, box):
+        x1, y1, x2, y2 = box
+        c = self.cell
+        return ((i, j) for i in range(int(x1 // c), int(x2 // c) + 1)
+                for j in range(int(y1 // c), int(y2 // c) + 1))
+
+    def add(self, box):
+        index = len(self.boxes)
+        self.boxes.append(box)
+        for cell in self._span(box):
+            self._cells[cell].append(index)
+
+    def overlap(self, box):
+        """Total area of box covered by stored boxes"""
+        seen = set()
+        area = 0.0
+        x1, y1, x2, y2 = box
+        for cell in self._span(box):
+            for index in self._cells.get(cell, ()):
+                if index in seen:
+                    continue
+                seen.add(index)
+                bx1, by1, bx2, by2 = self.boxes[index]
+                w = min(x2, bx2) - max(x1, bx1)
+                h = min(y2, by2) - max(y1, by1)
+                if w > 0 and h > 0:
+                    area += w * h
+        return area
+
+def _summed(mask):
+    table = np.zeros((mask.shape[0] + 1, mask.shape[1] + 1), dtype=np.int32)
+    table[1:, 1:] = mask.cumsum(axis=0).cumsum(axis=1)
+    return table
+
+def pixel_tables(img, background):
+    """PixelTables of busy pixels (differing sharply from a neighbour) and
+    of covered pixels (anything but the background)"""
+    a = np.asarray(img.convert('RGB'), dtype=np.int16)
+    busy = np.zeros(a.shape[:2], dtype=bool)
+    busy[:, 1:] |= np.abs(np.diff(a, axis=1)).max(axis=2) > BUSY_THRESHOLD
+    busy[1:, :] |= np.abs(np.diff(a, axis=0)).max(axis=2) > BUSY_THRESHOLD
+    covered = (a != ImageColor.getrgb(background)[:3]).any(axis=2)
+    return PixelTables(busy, covered, _summed(busy), _summed(covered))
+
+def base_tables(dl, cache=None):
+    """PixelTables of dl's base layer at 1x. With cache (a layers.LayerCache)
+    they are kept next to the base raster, under its key, and shared: callers
+    must not modify them."""
+    if not cache:
+        return pixel_tables(layers.render_base(dl), dl.background)
+    key = layers.base_key(dl)
+    tables = cache.get(key, 'tables')
+    if tables is None:
+        tables = pixel_tables(layers.render_base(dl, 1, cache, key), dl.background)
+        cache.put(key, tables, 'tables')
+    return tables
+
+def _segment_points(start, end):
+    """Integer pixels along start-end, one per pixel of length"""
+    steps = max(1, int(math.ceil(math.dist(start, end))))
+    t = np.linspace(0.0, 1.0, steps + 1)
+    xs = np.rint(start[0] + (end[0] - start[0]) * t).astype(np.intp)
+    ys = np.rint(start[1] + (end[1] - start[1]) * t).astype(np.intp)
+    return xs, ys
+
+def _mark(mask, table, xs, ys):
+    """Set the pixels xs, ys in mask and update its summed-area table"""
+    height, width = mask.shape
+    keep = (xs >= 0) & (xs < width) & (ys >= 0) & (ys < height)
+    xs, ys = xs[keep], ys[keep]
+    if not len(xs):
+        return
+    x0, y0, x1, y1 = xs.min(), ys.min(), xs.max() + 1, ys.max() + 1
+    delta = np.zeros((y1 - y0, x1 - x0), dtype=bool)
+    delta[ys - y0, xs - x0] = True
+    delta &= ~mask[y0:y1, x0:x1]
+    mask[y0:y1, x0:x1] |= delta
+    # Every table entry below and right of a new pixel counts it once more
+    local = _summed(delta)
+    table[y0:y1 + 1, x0:x1 + 1] += local
+    table[y0:y1 + 1, x1 + 1:] += local[:, -1:]
+    table[y1 + 1:, x0:x1 + 1] += local[-1:, :]
+    table[y1 + 1:, x1 + 1:] += local[-1, -1]
+
+def fraction(table, box):
+    """Share of set pixels inside box (clipped to the table)"""
+    height, width = table.shape[0] - 1, table.shape[1] - 1
+    x1, y1 = max(0, int(box[0])), max(0, int(box[1]))
+    x2, y2 = min(width, int(math.ceil(box[2]))), min(height, int(math.ceil(box[3])))
+    if x2 <= x1 or y2 <= y1:
+        return 0.0
+    count = table[y2, x2] - table[y1, x2] - table[y2, x1] + table[y1, x1]
+    return count / ((x2 - x1) * (y2 - y1))
+
+def _text_box(xy, text, style, margin=0):
+    left, top, right, bottom = fonts.text_bbox(style, text)
+    x, y = xy
+    return (x + left - margin, y + top - margin, x + right + margin, y + bottom + margin)
+
+def _block(label):
+    """(width, height, note y offset) of a label's text block"""
+    _, _, right, bottom = fonts.text_bbox(label.style, label.text)
+    width, height, note_dy = right, bottom, None
+    if label.note:
+        note_dy = bottom + 2
+        _, _, note_right, note_bottom = fonts.text_bbox('caption', label.note)
+        width, height = max(width, note_right), note_dy + note_bottom
+    return width, height, note_dy
+
+def _candidates(label, width, height):
+    """Top-left corners to try: the preferred spot first, then rings"""
+    ax, ay = label.anchor
+    if label.near is not None:
+        yield tuple(label.near)
+    for gap in RING_GAPS:
+        for k in range(DIRECTIONS):
+            angle = 2 * math.pi * k / DIRECTIONS
+            dx, dy = math.cos(angle), math.sin(angle)
+            # Put the box's near side gap pixels from the anchor
+            cx = ax + dx * (gap + width / 2)
+            cy = ay + dy * (gap + height / 2)
+            yield (round(cx - width / 2), round(cy - height / 2))
+
+def _leader_end(anchor, box):
+    """Point on box (grown by the label margin) nearest to anchor"""
+    ax, ay = anchor
+    x1, y1, x2, y2 = box
+    return (min(max(ax, x1 - LABEL_MARGIN), x2 + LABEL_MARGIN),
+            min(max(ay, y1 - LABEL_MARGIN), y2 + LABEL_MARGIN))
+
+def _leader_boxes(start, end, width):
+    """Boxes covering the leader start-end, LEADER_PIECE pixels at a time"""
+    pieces = max(1, int(math.ceil(math.dist(start, end) / LEADER_PIECE)))
+    pad = width / 2 + LABEL_MARGIN / 2
+    for k in range(pieces):
+        (x1, y1), (x2, y2) = [(start[0] + (end[0] - start[0]) * t, start[1] + (end[1] - start[1]) * t)
+                              for t in (k / pieces, (k + 1) / pieces)]
+        yield (min(x1, x2) - pad, min(y1, y2) - pad, max(x1, x2) + pad, max(y1, y2) + pad)
+
+def _leader_cost(label, end, taken, tables):
+    """Cost of the leader from label's anchor to end: other labels and
+    leaders it runs into, and the edges and fills it crosses"""
+    if not label.leader_width or math.dist(label.anchor, end) < MIN_LEADER:
+        return 0.0
+    xs, ys = _segment_points(label.anchor, end)
+    xs, ys = xs[LEADER_CLEARANCE:], ys[LEADER_CLEARANCE:]
+    height, width = tables.busy.shape
+    keep = (xs >= 0) & (xs < width) & (ys >= 0) & (ys < height)
+    xs, ys = xs[keep], ys[keep]
+    overlap = sum(taken.overlap(box) for box in _leader_boxes(label.anchor, end, label.leader_width))
+    return (TEXT_OVERLAP_COST * overlap
+            + LEADER_BUSY_COST * int(tables.busy[ys, xs].sum())
+            + LEADER_COVER_COST * int(tables.covered[ys, xs].sum()))
+
+def place(label, size, taken, tables):
+    """Best top-left corner for label, given the grid of taken boxes and the
+    base layer's PixelTables"""
+    width, height, _ = _block(label)
+    canvas_w, canvas_h = size
+    ax, ay = label.anchor
+    if label.near is not None:
+        preferred = (label.near[0] + width / 2, label.near[1] + height / 2)
+    else:
+        preferred = (ax, ay)
+
+    best, best_cost = None, math.inf
+    for x, y in _candidates(label, width, height):
+        box = (x, y, x + width, y + height)
+        if (box[0] < CANVAS_MARGIN or box[1] < CANVAS_MARGIN
+                or box[2] > canvas_w - CANVAS_MARGIN or box[3] > canvas_h - CANVAS_MARGIN):
+            continue
+        grown = (box[0] - LABEL_MARGIN, box[1] - LABEL_MARGIN, box[2] + LABEL_MARGIN, box[3] + LABEL_MARGIN)
+        busy, covered = fraction(tables.busy_sum, grown), fraction(tables.covered_sum, grown)
+        cost = (TEXT_OVERLAP_COST * taken.overlap(grown)
+                + BUSY_COST * busy
+                + COVER_COST * covered
+                + DISTANCE_COST * math.hypot(x + width / 2 - preferred[0], y + height / 2 - preferred[1]))
+        if box[0] <= ax <= box[2] and box[1] <= ay <= box[3]:
+            cost += TEXT_OVERLAP_COST
+        if busy > MAX_BUSY or covered > MAX_COVER:
+            cost += TEXT_OVERLAP_COST
+        if cost < best_cost:
+            cost += _leader_cost(label, _leader_end(label.anchor, box), taken, tables)
+        if cost < best_cost:
+            best, best_cost = (x, y), cost
+    if best is None:
+        # Nothing fits on the canvas: clamp the preferred spot inside it
+        x, y = label.near if label.near is not None else (ax, ay)
+        best = (min(max(x, CANVAS_MARGIN), canvas_w - CANVAS_MARGIN - width),
+                min(max(y, CANVAS_MARGIN), canvas_h - CANVAS_MARGIN - height))
+    return best
+
+def resolve(dl, cache=None):
+    """dl with every label op placed and replaced by leader and text ops.
+
+    Text already in dl and each placed label and leader count as taken;
+    labels are placed in the order they were drawn. cache is a
+    layers.LayerCache holding the base layer and its pixel tables, so a
+    label-only edit neither re-renders the base nor rebuilds the tables.
+    """
+    if not any(op[0] == 'label' for op in dl.ops):
+        return dl
+    # Leaders are marked as they are placed, so work on copies
+    tables = PixelTables(*(a.copy() for a in base_tables(dl, cache)))
+    taken = BoxGrid()
+    for method, args, kwargs in dl.ops:
+        if method == 'text' and kwargs.get('style'):
+            taken.add(_text_box(args[0], args[1], kwargs['style'], LABEL_MARGIN))
+
+    resolved = DisplayList(dl.size, dl.background)
+    for method, args, kwargs in dl.ops:
+        if method != 'label':
+            resolved.ops.append((method, args, kwargs))
+            continue
+        label = Label(*args, **kwargs)
+        x, y = place(label, dl.size, taken, tables)
+        width, height, note_dy = _block(label)
+        box = (x, y, x + width, y + height)
+        taken.add((box[0] - LABEL_MARGIN, box[1] - LABEL_MARGIN,
+                   box[2] + LABEL_MARGIN, box[3] + LABEL_MARGIN))
+        end = _leader_end(label.anchor, box)
+        if label.leader_width and math.dist(label.anchor, end) >= MIN_LEADER:
+            resolved.ops.append(('leader', ([tuple(label.anchor), end],),
+                                 {'fill': label.fill, 'width': label.leader_width}))
+            for piece in _leader_boxes(label.anchor, end, label.leader_width):
+                taken.add(piece)
+            xs, ys = _segment_points(label.anchor, end)
+            _mark(tables.busy, tables.busy_sum, xs, ys)
+            _mark(tables.covered, tables.covered_sum, xs, ys)
+        resolved.ops.append(('text', ((x, y), label.text), {'fill': label.fill, 'style': label.style}))
+        if label.note:
+            resolved.ops.append(('text', ((x, y + note_dy), label.note),
+                                 {'fill': label.note_fill, 'style': 'caption'}))
+    return resolved
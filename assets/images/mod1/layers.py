@@ -0,0 +1,141 @@
+"""
+Layered rendering for the Module 1 diagram generator
+Splits a display list into a base layer (background, structure and the
+NumPy textures, which paint over the shapes drawn before them and so keep
+their drawing order) and a labels layer (every text op and label leader),
+which is always composited on top. Base rasters are kept in memory keyed by
+a digest of their own ops, so fixing a label's wording replays only the
+labels onto the cached base. The cache lives only as long as its process:
+it pays off across edits in the long-lived worker and serve processes and
+in a serial (-j 1) --watch. A one-shot build, or a pooled --watch -j N
+rebuild in fresh worker processes, only shares each base between that
+job's label placement and its render. Bases are not kept on disk: replaying
+one takes milliseconds (textures are computed at capture), no longer than
+reading a saved raster back.
+"""
+
+import functools
+import hashlib
+from collections import OrderedDict
+
+import numpy as np
+
+import display_list
+import stamps
+from build_cache import function_fingerprint, make_key, module_fingerprint
+from display_list import RasterBackend
+
+# Ops composited above everything else, in the labels layer
+LABEL_METHODS = ('text', 'leader', 'label')
+
+# Base rasters kept per process (an 800x600 base is 1.4 MB, 5.8 MB at 2x,
+# plus 4.3 MB of label placement tables at 1x)
+DEFAULT_LAYER_CACHE = 32
+
+def split(display_list):
+    """(base ops, label ops), each in drawing order"""
+    base, labels = [], []
+    for op in display_list.ops:
+        (labels if op[0] in LABEL_METHODS else base).append(op)
+    return base, labels
+
+@functools.lru_cache(maxsize=64)
+def _source_fingerprint(func):
+    # Reloading a module makes new function objects, so this never goes stale
+    return function_fingerprint(func)
+
+def _feed(digest, value):
+    """Feed a canonical encoding of an op argument into digest"""
+    if isinstance(value, np.ndarray):
+        digest.update(f"nd{value.dtype.str}{value.shape}".encode())
+        digest.update(np.ascontiguousarray(value).tobytes())
+    elif isinstance(value, (list, tuple)):
+        digest.update(f"{type(value).__name__}{len(value)}(".encode())
+        for item in value:
+            _feed(digest, item)
+        digest.update(b')')
+    elif isinstance(value, dict):
+        digest.update(f"dict{len(value)}(".encode())
+        for key in sorted(value):
+            _feed(digest, key)
+            _feed(digest, value[key])
+        digest.update(b')')
+    elif callable(value) and hasattr(value, '__code__'):
+        # Raster effects: their source (and local helpers) is the content
+        digest.update(f"fn{value.__module__}.{value.__qualname__}".encode())
+        digest.update(_source_fingerprint(value).encode())
+    elif hasattr(value, 'getbbox') and hasattr(value, 'size'):
+        # Fonts: the face file and size identify the glyphs
+        digest.update(f"font{getattr(value, 'path', type(value).__name__)}{value.size}".encode())
+    else:
+        digest.update(f"{type(value).__name__}:{value!r};".encode())
+
+def op_digest(ops):
+    """Hash of a sequence of display-list ops"""
+    digest = hashlib.sha256()
+    for method, args, kwargs in ops:
+        _feed(digest, (method, args, kwargs))
+    return digest.hexdigest()
+
+class LayerCache:
+    """Least-recently-used base rasters, keyed by layer key. Values derived
+    from a raster (kind names them, e.g. label_layout's 'tables') are kept
+    under the same key and evicted with it."""
+
+    def __init__(self, capacity=DEFAULT_LAYER_CACHE):
+        self.capacity = capacity
+        self._items = OrderedDict()
+
+    def get(self, key, kind='image'):
+        entry = self._items.get(key)
+        if entry is None or kind not in entry:
+            return None
+        self._items.move_to_end(key)
+        return entry[kind]
+
+    def put(self, key, value, kind='image'):
+        self._items.setdefault(key, {})[kind] = value
+        self._items.move_to_end(key)
+        while len(self._items) > self.capacity:
+            self._items.popitem(last=False)
+
+# Shared by builds, the worker and the server within one process; see above
+# for when that outlives a single diagram
+BASE_CACHE = LayerCache()
+
+# Replay code that every cached layer depends on
+ENGINE_FINGERPRINT = module_fingerprint(display_list, stamps)
+
+def _replay(backend, ops):
+    for method, args, kwargs in ops:
+        getattr(backend, method)(*args, **kwargs)
+    return backend
+
+def base_key(dl, scale=1):
+    """LayerCache key of dl's base layer at scale"""
+    return make_key(ENGINE_FINGERPRINT, op_digest(split(dl)[0]), dl.size, dl.background, scale)
+
+def render_base(dl, scale=1, cache=None, key=None):
+    """The base layer of dl at scale, from cache when its ops are unchanged.
+    key is base_key(dl, scale) if the caller already has it. The returned
+    image is shared with the cache and must not be modified."""
+    if cache and key is None:
+        key = base_key(dl, scale)
+    img = cache.get(key) if cache else None
+    if img is None:
+        img = _replay(RasterBackend(dl.size, dl.background, scale), split(dl)[0]).image
+        if cache:
+            cache.put(key, img)
+    return img
+
+def render(dl, scale=1, cache=None):
+    """Rasterize a display list: the base layer with the labels layer drawn
+    over a copy of it.
+
+    Replaying the label ops onto the base blends exactly as compositing a
+    separately rasterized label layer would, and is cheaper than keeping
+    one, so only the base is cached.
+    """
+    backend = RasterBackend(dl.size, dl.background, scale)
+    backend.image.paste(render_base(dl, scale, cache))
+    return _replay(backend, split(dl)[1]).image
@@ -0,0 +1,170 @@
+"""
+Hashed asset manifest for the Module 1 images
+Indexes every lessonNN/ image under an output root (built here or not) into
+image-manifest.json: logical name -> content hash, bytes, dimensions,
+thumbnail, variant and theme files (with the media query for <picture>
+sources), plus the precache list that
+assets/js/service-worker.js uses to fetch only images whose hash changed.
+Optionally publishes content-hashed copies (nucleus-diagram.3f9c2a1b7e.webp)
+for immutable caching, and removes any hashed copy the manifest stops listing.
+"""
+
+import glob
+import hashlib
+import json
+import os
+import re
+
+from PIL import Image
+
+from encoding import EXTENSIONS, mirror_file, publish
+from themes import THEMES
+
+MANIFEST_NAME = 'image-manifest.json'
+MANIFEST_VERSION = 1
+HASH_LENGTH = 10
+
+IMAGE_EXTENSIONS = tuple(sorted(set(EXTENSIONS.values())))
+
+# Suffixes that mark a file as a variant of another image rather than its own entry
+VARIANT_SUFFIXES = ('@2x', '-thumb')
+
+# Primary file preference: WebP, then the PNG an indexed (--palette) build
+# writes when it encodes smaller
+PRIMARY_EXTENSIONS = ('.webp', '.png')
+
+_HASHED_NAME = re.compile(rf'\.[0-9a-f]{{{HASH_LENGTH}}}$')
+
+def content_hash(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()[:HASH_LENGTH]
+
+def hashed_name(rel_path, digest):
+    """lesson02/nucleus.webp -> lesson02/nucleus.<digest>.webp"""
+    stem, ext = os.path.splitext(rel_path)
+    return f"{stem}.{digest}{ext}"
+
+def _logical_name(rel_path):
+    """(logical name, theme or None) of an image file"""
+    stem = os.path.splitext(rel_path)[0]
+    for suffix in VARIANT_SUFFIXES:
+        if stem.endswith(suffix):
+            stem = stem[:-len(suffix)]
+            break
+    for theme in THEMES:
+        if stem.endswith(f"-{theme}"):
+            return stem[:-len(theme) - 1], theme
+    return stem, None
+
+def _primary(name, described):
+    return next((f"{name}{ext}" for ext in PRIMARY_EXTENSIONS if f"{name}{ext}" in described),
+                next(iter(described)))
+
+def _describe(root, rel_path):
+    path = os.path.join(root, rel_path)
+    entry = {'src': rel_path, 'hash': content_hash(path), 'bytes': os.path.getsize(path)}
+    if not rel_path.endswith('.svg'):
+        with Image.open(path) as img:
+            entry['width'], entry['height'] = img.size
+    return entry
+
+def _lesson_images(root):
+    """(path relative to root, whether it is a content-hashed copy) of every
+    image file under root's lessonNN/ directories"""
+    for path in glob.glob(os.path.join(root, 'lesson[0-9][0-9]', '*')):
+        stem, ext = os.path.splitext(path)
+        if ext in IMAGE_EXTENSIONS:
+            yield os.path.relpath(path, root).replace(os.sep, '/'), bool(_HASHED_NAME.search(stem))
+
+def scan(root):
+    """Image files under root's lessonNN/ directories, relative to root,
+    ignoring content-hashed copies"""
+    return sorted(rel_path for rel_path, hashed in _lesson_images(root) if not hashed)
+
+def build_manifest(root, hashed=False):
+    """Manifest dict for every image under root.
+
+    Each logical image (lesson02/nucleus-diagram) records its primary WebP
+    (or PNG, or the first file found), thumbnail and remaining variants. The
+    precache list holds primaries and thumbnails only; @2x, fallback formats
+    and theme variants are left to the runtime cache. Theme variants are
+    listed under 'themes' by theme name, each with its primary file, media
+    query and remaining variants. With hashed, every file also records its
+    content-hashed name, which the precache list then uses.
+    """
+    groups = {}
+    for rel_path in scan(root):
+        name, theme = _logical_name(rel_path)
+        groups.setdefault(name, {}).setdefault(theme, []).append(rel_path)
+
+    images = {}
+    precache = []
+    for name, by_theme in sorted(groups.items()):
+        if None not in by_theme:
+            continue
+        described = {rel_path: _describe(root, rel_path) for rel_path in by_theme.pop(None)}
+        thumb_path = f"{name}-thumb.webp"
+        entry = dict(described.pop(_primary(name, described)))
+        thumb = described.pop(thumb_path, None)
+        if thumb:
+            entry['thumbnail'] = thumb
+        if described:
+            entry['variants'] = sorted(described.values(), key=lambda v: v['src'])
+        for theme, files in sorted(by_theme.items()):
+            described = {rel_path: _describe(root, rel_path) for rel_path in files}
+            themed = {**described.pop(_primary(f"{name}-{theme}", described)), 'media': THEMES[theme].media}
+            if described:
+                themed['variants'] = sorted(described.values(), key=lambda v: v['src'])
+            entry.setdefault('themes', {})[theme] = themed
+        for file_entry in _entry_files(entry):
+            if hashed:
+                file_entry['hashed'] = hashed_name(file_entry['src'], file_entry['hash'])
+        for file_entry in (entry, thumb):
+            if file_entry:
+                precache.append({'url': file_entry.get('hashed', file_entry['src']),
+                                 'hash': file_entry['hash']})
+        images[name] = entry
+    return {'version': MANIFEST_VERSION, 'images': images, 'precache': precache}
+
+def _entry_files(entry):
+    """Every file record of one manifest image"""
+    yield entry
+    if 'thumbnail' in entry:
+        yield entry['thumbnail']
+    yield from entry.get('variants', [])
+    for themed in entry.get('themes', {}).values():
+        yield themed
+        yield from themed.get('variants', [])
+
+def _file_entries(manifest):
+    for entry in manifest['images'].values():
+        yield from _entry_files(entry)
+
+def publish_hashed(roots, manifest):
+    """Link each file to its content-hashed name under every root"""
+    for file_entry in _file_entries(manifest):
+        for root in roots:
+            target = os.path.join(root, file_entry['hashed'])
+            if not os.path.exists(target):
+                mirror_file(os.path.join(roots[0], file_entry['src']), target)
+
+def prune_hashed(roots, manifest):
+    """Remove every content-hashed copy under each root that manifest does
+    not list: earlier hashes of a file, copies of variants no longer built,
+    and all of them once a build runs without hashed names"""
+    listed = {file_entry['hashed'] for file_entry in _file_entries(manifest) if 'hashed' in file_entry}
+    for root in roots:
+        for rel_path, hashed in _lesson_images(root):
+            if hashed and rel_path not in listed:
+                os.unlink(os.path.join(root, rel_path))
+
+def write_manifest(roots, hashed=False):
+    """Index the primary root and publish image-manifest.json to every root,
+    then remove the content-hashed copies it no longer lists. Returns the
+    manifest."""
+    manifest = build_manifest(roots[0], hashed)
+    if hashed:
+        publish_hashed(roots, manifest)
+    publish(roots, MANIFEST_NAME, (json.dumps(manifest, indent=2, sort_keys=True) + '\n').encode('utf-8'))
+    prune_hashed(roots, manifest)
+    return manifest
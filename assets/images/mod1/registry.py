@@ -0,0 +1,59 @@
+"""
+Diagram registry for the Module 1 generator
+Each create_* function registers itself with @diagram(lesson, name, size,
+tags=...), declaring where its output goes; builds, benchmarks and
+verification then select jobs by name, lesson or tag instead of walking a
+hand-maintained table.
+"""
+
+import os
+from collections import namedtuple
+
+DEFAULT_BACKGROUND = '#f8fafc'
+DEFAULT_ENCODE = {'format': 'WEBP', 'quality': 85}
+
+# Pure vector drawings (no raster layers) that --svg can export
+LINE_ART = 'line-art'
+
+Job = namedtuple('Job', 'lesson name func output size background encode params inputs budget tags')
+
+# Jobs registered by @diagram, in definition order
+REGISTRY = []
+
+def job(lesson, func, output, size, background=DEFAULT_BACKGROUND, encode=None, params=None,
+        name=None, inputs=(), budget=None, tags=()):
+    """Declare a render job drawing func(draw, **params) onto a size canvas.
+
+    output is relative to the output root and inputs are extra files (such as
+    specs) whose contents feed the cache key. budget is the byte limit per
+    encoded variant (default: --budget). tags group jobs for selection;
+    LINE_ART marks drawings that --svg can also export as a vector file.
+    """
+    return Job(lesson, name or func.__name__, func, output, tuple(size), background,
+               encode or DEFAULT_ENCODE, params or {}, tuple(inputs), budget, tuple(tags))
+
+def diagram(lesson, name, size, background=DEFAULT_BACKGROUND, encode=None, budget=None, tags=()):
+    """Register the decorated generator as lessonNN/<name>.webp"""
+    def register(func):
+        REGISTRY.append(job(lesson, func, f"lesson{lesson:02d}/{name}.webp", size, background,
+                            encode, budget=budget, tags=tags))
+        return func
+    return register
+
+def job_id(job):
+    """Short name used on the command line: the output's file stem"""
+    return os.path.splitext(os.path.basename(job.output))[0]
+
+def select(jobs, only=(), lessons=(), tags=()):
+    """The jobs matching every given filter, in their original order.
+
+    only holds output stems (nucleus-diagram) or generator names
+    (create_nucleus_diagram); an unknown name raises KeyError.
+    """
+    unknown = set(only) - {job_id(j) for j in jobs} - {j.name for j in jobs}
+    if unknown:
+        raise KeyError(', '.join(sorted(unknown)))
+    return [j for j in jobs
+            if (not only or job_id(j) in only or j.name in only)
+            and (not lessons or j.lesson in lessons)
+            and (not tags or set(tags) & set(j.tags))]
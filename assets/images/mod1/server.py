@@ -0,0 +1,194 @@
+"""
+Local on-demand diagram server for the Module 1 generator
+Serves /mod1/lessonNN/<name>.<ext>?w=480&q=80 by rendering the diagram's
+display list at the requested size, so the front end can ask for any
+responsive width without it being pre-built. Renders are keyed by the
+diagram's source fingerprint plus the request; results live in a byte-capped
+in-memory LRU backed by an on-disk cache, and the key doubles as the ETag
+for conditional requests.
+
+Query parameters: w (width) or h (height) in pixels, q (quality 1-100),
+lossless=1 for lossless WebP. The extension picks the format: .webp, .png,
+.jpg, .avif or .svg (line art only).
+"""
+
+import os
+import posixpath
+import threading
+import urllib.parse
+from collections import OrderedDict
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from build_cache import make_key
+from encoding import MIME_TYPES, write_bytes
+from worker import FORMATS, RequestError
+
+URL_PREFIX = '/mod1/'
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+DEFAULT_MEMORY_CACHE = 64 * 1024 * 1024
+DISK_CACHE_NAME = '.render-cache'
+
+# Largest on-demand render, as a multiple of the diagram's own size
+MAX_SCALE = 4
+
+class ByteLRU:
+    """Least-recently-used mapping bounded by the total size of its values"""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.size = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._items:
+                return None
+            self._items.move_to_end(key)
+            return self._items[key]
+
+    def put(self, key, data):
+        if len(data) > self.capacity:
+            return
+        with self._lock:
+            if key in self._items:
+                self.size -= len(self._items.pop(key))
+            self._items[key] = data
+            self.size += len(data)
+            while self.size > self.capacity:
+                _, evicted = self._items.popitem(last=False)
+                self.size -= len(evicted)
+
+class DiagramService:
+    """Resolves URLs to render requests and answers them through the caches.
+
+    renderer is a worker.Renderer; source_key(job) returns the cache key of
+    a diagram's source and inputs (as the build cache computes it).
+    """
+
+    def __init__(self, renderer, source_key, cache_dir, memory_bytes=DEFAULT_MEMORY_CACHE):
+        self.renderer = renderer
+        self.source_key = source_key
+        self.cache_dir = cache_dir
+        self.memory = ByteLRU(memory_bytes)
+        self._source_keys = {}
+        self._render_lock = threading.Lock()
+
+    def _job_key(self, job):
+        # Specs can change while serving; generator code needs a restart
+        mtimes = tuple(os.stat(path).st_mtime_ns for path in job.inputs)
+        cached = self._source_keys.get(job.name)
+        if cached is None or cached[0] != mtimes:
+            cached = self._source_keys[job.name] = (mtimes, self.source_key(job))
+        return cached[1]
+
+    def resolve(self, url):
+        """URL -> (render request, render key); raises LookupError or RequestError"""
+        parsed = urllib.parse.urlsplit(url)
+        path = posixpath.normpath(urllib.parse.unquote(parsed.path))
+        if not path.startswith(URL_PREFIX):
+            raise LookupError(path)
+        lesson_dir, filename = posixpath.split(path[len(URL_PREFIX):])
+        name, ext = posixpath.splitext(filename)
+        job = self.renderer.jobs.get(name)
+        if job is None or posixpath.dirname(job.output) != lesson_dir or ext[1:].lower() not in FORMATS:
+            raise LookupError(path)
+
+        query = urllib.parse.parse_qs(parsed.query)
+        request = {'diagram': name, 'format': ext[1:].lower()}
+        try:
+            if 'w' in query:
+                request['width'] = int(query['w'][0])
+            elif 'h' in query:
+                request['height'] = int(query['h'][0])
+            if 'q' in query:
+                request['quality'] = int(query['q'][0])
+        except ValueError as e:
+            raise RequestError(str(e)) from e
+        request['lossless'] = query.get('lossless', ['0'])[0] in ('1', 'true')
+        if not 1 <= request.get('quality', 85) <= 100:
+            raise RequestError('q must be between 1 and 100')
+        for field, extent in (('width', job.size[0]), ('height', job.size[1])):
+            if not 0 < request.get(field, extent) <= extent * MAX_SCALE:
+                raise RequestError(f"{field} must be between 1 and {extent * MAX_SCALE}")
+        key = make_key(self._job_key(job), sorted(request.items()))
+        return request, key
+
+    def _disk_path(self, key, fmt):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.{fmt.lower()}")
+
+    def get(self, request, key):
+        """(bytes, content type, source) for a resolved request, rendering on a miss"""
+        fmt = FORMATS[request['format']]
+        content_type = MIME_TYPES[fmt]
+        data = self.memory.get(key)
+        if data is not None:
+            return data, content_type, 'memory'
+        path = self._disk_path(key, fmt)
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                data = f.read()
+            source = 'disk'
+        else:
+            with self._render_lock:
+                data, _ = self.renderer.render(request)
+            write_bytes(path, data)
+            source = 'render'
+        self.memory.put(key, data)
+        return data, content_type, source
+
+class DiagramHandler(BaseHTTPRequestHandler):
+    server_version = 'Mod1Diagrams/1.0'
+
+    def _respond(self, send_body):
+        service = self.server.service
+        try:
+            request, key = service.resolve(self.path)
+        except LookupError:
+            self.send_error(HTTPStatus.NOT_FOUND)
+            return
+        except RequestError as e:
+            self.send_error(HTTPStatus.BAD_REQUEST, str(e))
+            return
+
+        etag = f'"{key[:32]}"'
+        if etag in (tag.strip() for tag in self.headers.get('If-None-Match', '').split(',')):
+            self.send_response(HTTPStatus.NOT_MODIFIED)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+        try:
+            data, content_type, source = service.get(request, key)
+        except Exception as e:
+            self.send_error(HTTPStatus.UNPROCESSABLE_ENTITY, f"{type(e).__name__}: {e}")
+            return
+        self.send_response(HTTPStatus.OK)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.send_header('ETag', etag)
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('X-Render-Cache', source)
+        self.end_headers()
+        if send_body:
+            self.wfile.write(data)
+
+    def do_GET(self):
+        self._respond(send_body=True)
+
+    def do_HEAD(self):
+        self._respond(send_body=False)
+
+def serve(service, host=DEFAULT_HOST, port=DEFAULT_PORT):
+    """Serve until interrupted; returns 0 on Ctrl+C"""
+    httpd = ThreadingHTTPServer((host, port), DiagramHandler)
+    httpd.service = service
+    print(f"Serving diagrams on http://{host}:{httpd.server_address[1]}{URL_PREFIX} (Ctrl+C to stop)")
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        print()
+    finally:
+        httpd.server_close()
+    return 0
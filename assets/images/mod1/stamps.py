@@ -0,0 +1,46 @@
+"""
+Stamp cache for repeated micro-shapes in the Module 1 diagrams
+Ribosomes, nuclear pores and nucleolar granules are the same small ellipse
+drawn dozens of times. Each distinct (shape, size, fill, outline, width) is
+rasterized once onto a transparent tile, kept in an LRU cache, and pasted
+with its own alpha at every position. A batch of copies is one display-list
+op, so shapes that are expensive to draw cost one rasterization per style.
+"""
+
+import functools
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+STAMP_SHAPES = ('ellipse', 'rectangle')
+
+# Distinct stamps kept rasterized; a full build uses a few dozen
+STAMP_CACHE_SIZE = 256
+
+@functools.lru_cache(maxsize=STAMP_CACHE_SIZE)
+def stamp(shape, rx, ry, fill=None, outline=None, width=1):
+    """Transparent RGBA tile holding shape drawn over [0, 0, 2rx, 2ry].
+
+    Tiles are shared between callers and must not be modified.
+    """
+    if shape not in STAMP_SHAPES:
+        raise ValueError(f"unknown stamp shape: {shape!r}")
+    tile = Image.new('RGBA', (2 * rx + 1, 2 * ry + 1), (0, 0, 0, 0))
+    getattr(ImageDraw.Draw(tile), shape)([0, 0, 2 * rx, 2 * ry], fill=fill, outline=outline, width=width)
+    return tile
+
+def stamp_shapes(img, shape, xs, ys, radius, fill=None, outline=None, width=1, scale=1):
+    """Draw shape over [x-rx, y-ry, x+rx, y+ry] for every centre in xs, ys.
+
+    Pixel-identical to one ImageDraw call per centre, but the shape is only
+    rasterized once per distinct style. radius is r or (rx, ry); centres and
+    radius are scaled, width is already in output pixels.
+    """
+    rx, ry = radius if isinstance(radius, (list, tuple)) else (radius, radius)
+    rx, ry = round(rx * scale), round(ry * scale)
+    tile = stamp(shape, rx, ry, fill, outline, width)
+    xs = np.rint(np.asarray(xs) * scale).astype(int) - rx
+    ys = np.rint(np.asarray(ys) * scale).astype(int) - ry
+    for x, y in zip(xs.tolist(), ys.tolist()):
+        img.paste(tile, (x, y), tile)
+    return img
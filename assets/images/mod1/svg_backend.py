@@ -0,0 +1,172 @@
+"""
+SVG backend for Module 1 display lists
+Replays the same drawing calls as the raster backend into a minified SVG
+document. Ellipses that repeat with the same size and style (ribosomes,
+nuclear pores, granules) are emitted once in <defs> and placed with <use>.
+Stamps become ordinary shapes (and so <use> references); raster layers
+(NumPy textures) have no vector form and are rejected.
+"""
+
+import math
+from collections import Counter
+from xml.sax.saxutils import escape, quoteattr
+
+import fonts
+from display_list import DEFAULT_FONT_SIZE, DEFAULT_SPACING, replay
+
+FONT_FAMILY = "'DejaVu Sans',Verdana,Helvetica,Arial,sans-serif"
+
+class SVGUnsupported(ValueError):
+    """Raised when a display list uses an op with no vector equivalent"""
+
+def _num(value):
+    """Compact number formatting for minified output"""
+    value = round(float(value), 2)
+    return str(int(value)) if value == int(value) else f"{value:g}"
+
+def _paint(fill=None, outline=None, width=1):
+    """fill/stroke attributes; Pillow draws outlines inside the shape's box"""
+    attrs = [f'fill={quoteattr(fill) if fill is not None else quoteattr("none")}']
+    if outline is not None:
+        attrs.append(f'stroke={quoteattr(outline)}')
+        if width != 1:
+            attrs.append(f'stroke-width="{_num(width)}"')
+    return ' '.join(attrs)
+
+def _points(xy):
+    if xy and isinstance(xy[0], (list, tuple)):
+        pairs = xy
+    else:
+        pairs = list(zip(xy[0::2], xy[1::2]))
+    return ' '.join(f"{_num(x)},{_num(y)}" for x, y in pairs)
+
+def _box(xy):
+    """Pillow's inclusive [x1, y1, x2, y2] (or two points) -> x, y, w, h"""
+    if isinstance(xy[0], (list, tuple)):
+        (x1, y1), (x2, y2) = xy
+    else:
+        x1, y1, x2, y2 = xy
+    return x1, y1, x2 - x1 + 1, y2 - y1 + 1
+
+class SVGBackend:
+    """Collects SVG elements while a display list is replayed"""
+
+    def __init__(self, size, background):
+        self.size = size
+        self.background = background
+        # SVG strings, or ('ellipse', key, cx, cy) resolved into <use> in to_svg()
+        self.elements = []
+
+    def _ellipse_parts(self, xy, fill=None, outline=None, width=1):
+        x, y, w, h = _box(xy)
+        inset = width / 2 if outline is not None else 0
+        rx, ry = w / 2 - inset, h / 2 - inset
+        key = (f'rx="{_num(rx)}" ry="{_num(ry)}" ' + _paint(fill, outline, width))
+        return key, x + w / 2, y + h / 2
+
+    def ellipse(self, xy, fill=None, outline=None, width=1):
+        key, cx, cy = self._ellipse_parts(xy, fill, outline, width)
+        self.elements.append(('ellipse', key, cx, cy))
+
+    def rectangle(self, xy, fill=None, outline=None, width=1):
+        self.rounded_rectangle(xy, 0, fill, outline, width)
+
+    def rounded_rectangle(self, xy, radius=0, fill=None, outline=None, width=1, **_):
+        x, y, w, h = _box(xy)
+        inset = width / 2 if outline is not None else 0
+        corner = f' rx="{_num(radius)}"' if radius else ''
+        self.elements.append(
+            f'<rect x="{_num(x + inset)}" y="{_num(y + inset)}" width="{_num(w - 2 * inset)}" '
+            f'height="{_num(h - 2 * inset)}"{corner} {_paint(fill, outline, width)}/>')
+
+    def _arc_path(self, xy, start, end, width=0):
+        x, y, w, h = _box(xy)
+        cx, cy = x + w / 2, y + h / 2
+        rx, ry = w / 2 - width / 2, h / 2 - width / 2
+        sweep = (end - start) % 360 or 360
+        p0 = (cx + rx * math.cos(math.radians(start)), cy + ry * math.sin(math.radians(start)))
+        p1 = (cx + rx * math.cos(math.radians(start + sweep)), cy + ry * math.sin(math.radians(start + sweep)))
+        large = 1 if sweep > 180 else 0
+        return cx, cy, (f"M{_num(p0[0])},{_num(p0[1])}A{_num(rx)},{_num(ry)} 0 {large} 1 "
+                        f"{_num(p1[0])},{_num(p1[1])}")
+
+    def arc(self, xy, start, end, fill=None, width=1):
+        _, _, path = self._arc_path(xy, start, end, width)
+        self.elements.append(f'<path d="{path}" fill="none" stroke={quoteattr(fill)} '
+                             f'stroke-width="{_num(width)}"/>')
+
+    def pieslice(self, xy, start, end, fill=None, outline=None, width=1):
+        cx, cy, path = self._arc_path(xy, start, end, width if outline is not None else 0)
+        self.elements.append(f'<path d="M{_num(cx)},{_num(cy)}L{path[1:]}Z" '
+                             f'{_paint(fill, outline, width)}/>')
+
+    def polygon(self, xy, fill=None, outline=None, width=1):
+        self.elements.append(f'<polygon points="{_points(xy)}" {_paint(fill, outline, width)}/>')
+
+    def line(self, xy, fill=None, width=0, joint=None):
+        join = ' stroke-linejoin="round"' if joint == 'curve' else ''
+        self.elements.append(f'<polyline points="{_points(xy)}" fill="none" stroke={quoteattr(fill)} '
+                             f'stroke-width="{_num(max(width, 1))}"{join}/>')
+
+    def point(self, xy, fill=None):
+        pairs = [xy] if not isinstance(xy[0], (list, tuple)) and len(xy) == 2 else xy
+        for x, y in pairs:
+            self.elements.append(f'<rect x="{_num(x)}" y="{_num(y)}" width="1" height="1" '
+                                 f'fill={quoteattr(fill)}/>')
+
+    def text(self, xy, text, fill=None, font=None, spacing=DEFAULT_SPACING, style=None, **_):
+        size = getattr(font, 'size', DEFAULT_FONT_SIZE)
+        weight = ''
+        if style is not None:
+            face, size, spacing = fonts.STYLES[style]
+            weight = ' font-weight="bold"' if face == 'bold' else ''
+        x, y = xy
+        lines = text.split('\n')
+        # Pillow anchors text at the top-left; SVG at the baseline
+        spans = ''.join(
+            f'<tspan x="{_num(x)}" dy="{_num(size if i == 0 else size + spacing)}">{escape(line)}</tspan>'
+            for i, line in enumerate(lines))
+        self.elements.append(f'<text y="{_num(y)}" font-size="{_num(size)}"{weight} '
+                             f'fill={quoteattr(fill or "black")}>{spans}</text>')
+
+    def leader(self, xy, **kwargs):
+        self.line(xy, **kwargs)
+
+    def stamp(self, shape, xs, ys, radius, fill=None, outline=None, width=1):
+        rx, ry = radius if isinstance(radius, (list, tuple)) else (radius, radius)
+        for x, y in zip(xs, ys):
+            getattr(self, shape)([x - rx, y - ry, x + rx, y + ry], fill=fill, outline=outline, width=width)
+
+    def layer(self, fn, *args, **kwargs):
+        raise SVGUnsupported(f"raster layer {fn.__name__} has no SVG form")
+
+    def to_svg(self, size=None):
+        """The finished, minified SVG document, optionally sized to (width, height)"""
+        counts = Counter(e[1] for e in self.elements if isinstance(e, tuple))
+        ids = {key: f"e{i}" for i, key in enumerate(k for k, n in counts.items() if n > 1)}
+        defs = ''.join(f'<ellipse id="{ids[key]}" {key}/>' for key in ids)
+
+        body = []
+        for element in self.elements:
+            if isinstance(element, tuple):
+                _, key, cx, cy = element
+                if key in ids:
+                    body.append(f'<use href="#{ids[key]}" x="{_num(cx)}" y="{_num(cy)}"/>')
+                else:
+                    body.append(f'<ellipse cx="{_num(cx)}" cy="{_num(cy)}" {key}/>')
+            else:
+                body.append(element)
+
+        width, height = self.size
+        out_width, out_height = size or self.size
+        return (f'<svg xmlns="http://www.w3.org/2000/svg" width="{out_width}" height="{out_height}" '
+                f'viewBox="0 0 {width} {height}" font-family="{FONT_FAMILY}">'
+                + (f'<defs>{defs}</defs>' if defs else '')
+                + f'<rect width="100%" height="100%" fill={quoteattr(self.background)}/>'
+                + ''.join(body) + '</svg>')
+
+def render_svg(display_list, size=None):
+    """Replay a display list into an SVG document string; size overrides the
+    document's width and height, keeping the drawing's own viewBox"""
+    backend = SVGBackend(display_list.size, display_list.background)
+    return replay(display_list, backend).to_svg(size)
@@ -0,0 +1,123 @@
+"""
+Vectorized texture layers for the simulated TEM/SEM diagrams
+Grain, fibril and speckle patterns are built as NumPy masks in one pass and
+composited onto the image, instead of one draw.point/draw.ellipse per dot.
+"""
+
+import numpy as np
+from PIL import Image, ImageColor
+
+def dot_kernel(radius):
+    """Offsets (dy, dx) covered by an elliptical dot; radius is r or (rx, ry)"""
+    rx, ry = radius if isinstance(radius, (tuple, list)) else (radius, radius)
+    if rx <= 0 and ry <= 0:
+        return np.zeros((1, 2), dtype=int)
+    dy, dx = np.mgrid[-int(ry):int(ry) + 1, -int(rx):int(rx) + 1]
+    # Pillow's ellipse([x-r, y-r, x+r, y+r]) spans 2r+1 pixels, so the
+    # effective semi-axis is r + 0.5
+    inside = (dx / (rx + 0.5)) ** 2 + (dy / (ry + 0.5)) ** 2 <= 1.0
+    return np.stack([dy[inside], dx[inside]], axis=1)
+
+def square_kernel(side):
+    """Offsets (dy, dx) of a side-by-side block anchored at the point"""
+    dy, dx = np.mgrid[0:side, 0:side]
+    return np.stack([dy.ravel(), dx.ravel()], axis=1)
+
+def dot_mask(size, xs, ys, radius=0, kernel=None):
+    """Boolean (height, width) mask with a dot of the given radius at each point"""
+    width, height = size
+    if kernel is None:
+        kernel = dot_kernel(radius)
+    # Every (point, kernel offset) pair at once: shape (points, offsets)
+    px = np.asarray(xs, dtype=int).reshape(-1, 1) + kernel[:, 1]
+    py = np.asarray(ys, dtype=int).reshape(-1, 1) + kernel[:, 0]
+    keep = (px >= 0) & (px < width) & (py >= 0) & (py < height)
+    mask = np.zeros((height, width), dtype=bool)
+    mask[py[keep], px[keep]] = True
+    return mask
+
+def paint(img, mask, fill):
+    """Composite a solid colour onto img wherever mask is set"""
+    rows = np.flatnonzero(mask.any(axis=1))
+    cols = np.flatnonzero(mask.any(axis=0))
+    if not len(rows):
+        return img
+    # Only composite the bounding box of the layer
+    top, bottom, left, right = rows[0], rows[-1] + 1, cols[0], cols[-1] + 1
+    alpha = Image.fromarray(mask[top:bottom, left:right].astype(np.uint8) * 255, 'L')
+    img.paste(fill, (int(left), int(top), int(right), int(bottom)), alpha)
+    return img
+
+def paint_dots(img, xs, ys, fill, radius=0, scale=1):
+    """Stamp one dot per point onto img in a single composite.
+
+    Coordinates and radius are in diagram units and multiplied by scale;
+    single-pixel dots (radius 0) grow to scale-by-scale blocks.
+    """
+    xs = np.asarray(xs) * scale
+    ys = np.asarray(ys) * scale
+    kernel = None
+    if scale != 1:
+        if radius in (0, (0, 0)):
+            kernel = square_kernel(max(1, round(scale)))
+        else:
+            rx, ry = radius if isinstance(radius, (tuple, list)) else (radius, radius)
+            radius = (rx * scale, ry * scale)
+    return paint(img, dot_mask(img.size, xs, ys, radius, kernel), fill)
+
+def lattice_grain(count, step_x, step_y, width, height, x0=0, y0=0):
+    """The (i * step) % extent pseudo-random grain used by the TEM backgrounds"""
+    i = np.arange(count)
+    return x0 + (i * step_x) % width, y0 + (i * step_y) % height
+
+def fibril_coords(cx, cy, arms, radii, arm_step=12, squash=0.6, y_twist=2):
+    """Twisted spiral arms of dots, as in a nucleoid's DNA fibrils"""
+    angle, r = np.meshgrid(np.arange(arms) * arm_step, np.asarray(radii))
+    xs = cx + (r * np.cos(np.radians(angle + r))).astype(int)
+    ys = cy + (r * squash * np.sin(np.radians(angle + r * y_twist))).astype(int)
+    return xs, ys
+
+def spiral_grain(count, cx, cy, radius_mod, angle_step=37, radius_step=11, squash=0.6):
+    """Deterministic grain scattered on a golden-angle style spiral"""
+    i = np.arange(count)
+    angle = np.radians(i * angle_step)
+    r = (i * radius_step) % radius_mod
+    return cx + (r * np.cos(angle)).astype(int), cy + (r * squash * np.sin(angle)).astype(int)
+
+def speckle_coords(rng, count, x_range, y_range):
+    """Uniform random speckle positions; ranges are inclusive like randint"""
+    xs = rng.integers(x_range[0], x_range[1] + 1, size=count)
+    ys = rng.integers(y_range[0], y_range[1] + 1, size=count)
+    return xs, ys
+
+def _rgb(colour):
+    if isinstance(colour, str):
+        colour = ImageColor.getrgb(colour)
+    return np.array(colour[:3], dtype=np.float32)
+
+def shading_mask(rx, ry, light=(0.0, 0.0)):
+    """Lambert shading (0-1) and coverage alpha (0-1) for an ellipsoid.
+
+    light is the (x, y) component of the unit light direction; (0, 0) lights
+    the ellipsoid head-on, negative values light it from the top-left.
+    """
+    ny = np.arange(-ry, ry + 1, dtype=np.float32)[:, None] / (ry + 0.5)
+    nx = np.arange(-rx, rx + 1, dtype=np.float32)[None, :] / (rx + 0.5)
+    t2 = nx * nx + ny * ny
+    nz = np.sqrt(np.clip(1.0 - t2, 0.0, 1.0))
+    lx, ly = light
+    lz = np.sqrt(max(0.0, 1.0 - lx * lx - ly * ly))
+    shade = np.clip(nx * lx + ny * ly + nz * lz, 0.0, 1.0)
+    # One pixel of antialiasing at the rim
+    alpha = np.clip((1.0 - np.sqrt(t2)) * min(rx, ry) + 0.5, 0.0, 1.0)
+    return shade, alpha
+
+def shaded_ellipsoid(img, cx, cy, rx, ry, edge, centre, light=(0.0, 0.0), scale=1):
+    """Paste a lit ellipsoid blending from edge colour (unlit) to centre (fully lit)"""
+    cx, cy, rx, ry = (round(v * scale) for v in (cx, cy, rx, ry))
+    shade, alpha = shading_mask(rx, ry, light)
+    edge, centre = _rgb(edge), _rgb(centre)
+    rgb = edge + (centre - edge) * shade[..., None]
+    patch = Image.fromarray(np.round(rgb).astype(np.uint8), 'RGB')
+    img.paste(patch, (cx - rx, cy - ry), Image.fromarray(np.round(alpha * 255).astype(np.uint8), 'L'))
+    return img
@@ -0,0 +1,54 @@
+"""
+Theme variants for the Module 1 diagram generator
+A dark or high-contrast copy of a diagram is the light render with every
+colour sent through one lookup table, so no generator runs twice. Themes
+work in HLS: hue is kept, lightness is optionally inverted, stretched about
+the middle and squeezed into a range, and saturation is scaled. Indexed
+(mode "P") renders remap their palette exactly; full-colour renders go
+through a 3D colour LUT in a single Image.filter call.
+"""
+
+import colorsys
+import functools
+from collections import namedtuple
+
+from PIL import ImageFilter
+
+# Grid points per axis of the 3D LUT for full-colour renders
+LUT_SIZE = 33
+
+Theme = namedtuple('Theme', 'media invert contrast lightness saturation')
+
+# media is the <source> media query that selects the variant
+THEMES = {
+    'dark': Theme('(prefers-color-scheme: dark)', invert=True, contrast=1.0,
+                  lightness=(0.07, 0.95), saturation=0.9),
+    'high-contrast': Theme('(prefers-contrast: more)', invert=False, contrast=1.6,
+                           lightness=(0.0, 1.0), saturation=1.2),
+}
+
+# Micrographs are already dark and their intensities are data
+UNTHEMED_TAGS = ('micrograph', 'tem')
+
+def remap(theme, r, g, b):
+    """The themed colour of (r, g, b), with channels in 0..1"""
+    h, l, s = colorsys.rgb_to_hls(r, g, b)
+    if theme.invert:
+        l = 1 - l
+    l = min(1.0, max(0.0, 0.5 + (l - 0.5) * theme.contrast))
+    low, high = theme.lightness
+    return colorsys.hls_to_rgb(h, low + (high - low) * l, min(1.0, s * theme.saturation))
+
+@functools.lru_cache(maxsize=None)
+def _lut(theme):
+    return ImageFilter.Color3DLUT.generate(LUT_SIZE, lambda r, g, b: remap(theme, r, g, b))
+
+def apply_theme(img, theme):
+    """img recoloured by theme, in img's own mode"""
+    if img.mode == 'P':
+        themed = img.copy()
+        values = img.getpalette()
+        colors = [remap(theme, *(v / 255 for v in values[i:i + 3])) for i in range(0, len(values), 3)]
+        themed.putpalette([round(c * 255) for color in colors for c in color])
+        return themed
+    return img.convert('RGB').filter(_lut(theme))
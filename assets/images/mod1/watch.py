@@ -0,0 +1,112 @@
+"""
+Watch mode for the Module 1 diagram generator
+Polls the generator's own modules and spec files for edits, reloads the
+changed modules (and the local modules that import them) with importlib, and
+hands control back to the build, whose content-hash cache then re-renders
+only the diagrams whose source or inputs actually changed.
+"""
+
+import ast
+import glob
+import importlib
+import os
+import sys
+import time
+import traceback
+
+WATCH_INTERVAL = 0.25
+
+def watched_files(base_path, spec_dir):
+    """Python modules next to the generator plus every spec file"""
+    return (sorted(glob.glob(os.path.join(base_path, '*.py')))
+            + sorted(glob.glob(os.path.join(spec_dir, '**', '*.json'), recursive=True)))
+
+def snapshot(paths):
+    """{path: mtime_ns} for the paths that currently exist"""
+    mtimes = {}
+    for path in paths:
+        try:
+            mtimes[path] = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            pass
+    return mtimes
+
+def _local_imports(path, local_names):
+    """Names of local modules imported by the module at path"""
+    with open(path, encoding='utf-8') as f:
+        tree = ast.parse(f.read(), path)
+    names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names.update(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            names.add(node.module)
+    return names & local_names
+
+def reload_modules(changed_paths, base_path, main_name):
+    """Reload local modules affected by changed_paths and return main_name's module.
+
+    A module is affected when its file changed or it imports an affected
+    module; affected modules are reloaded dependencies first, and main_name
+    is always imported afresh last so it sees every reloaded dependency.
+    """
+    modules = {os.path.splitext(os.path.basename(p))[0]: p
+               for p in glob.glob(os.path.join(base_path, '*.py'))}
+    imports = {name: _local_imports(path, set(modules)) for name, path in modules.items()}
+    affected = {name for name, path in modules.items() if path in changed_paths}
+    grew = True
+    while grew:
+        importers = {name for name, deps in imports.items() if deps & affected} - affected
+        grew = bool(importers)
+        affected |= importers
+
+    order, done = [], set()
+
+    def visit(name):
+        if name in done:
+            return
+        done.add(name)
+        for dep in sorted(imports[name]):
+            visit(dep)
+        order.append(name)
+    for name in sorted(affected):
+        visit(name)
+
+    importlib.invalidate_caches()
+    for name in order:
+        if name in affected and name != main_name and name in sys.modules:
+            importlib.reload(sys.modules[name])
+    if main_name in sys.modules:
+        return importlib.reload(sys.modules[main_name])
+    return importlib.import_module(main_name)
+
+def watch(rebuild, paths, interval=WATCH_INTERVAL):
+    """Call rebuild(None) now, then rebuild(changed_paths) after every edit.
+
+    paths() lists the files to poll, so new specs are picked up. Errors in
+    rebuild (including syntax errors while reloading) are printed and the
+    loop keeps watching. Returns 0 on Ctrl+C.
+    """
+    def attempt(changed):
+        try:
+            rebuild(changed)
+        except Exception:
+            traceback.print_exc()
+
+    mtimes = snapshot(paths())
+    attempt(None)
+    print(f"\nWatching {len(mtimes)} files for changes (Ctrl+C to stop)...")
+    try:
+        while True:
+            time.sleep(interval)
+            current = snapshot(paths())
+            changed = {path for path in current.keys() | mtimes.keys()
+                       if current.get(path) != mtimes.get(path)}
+            if not changed:
+                continue
+            mtimes = current
+            print(f"\nChanged: {', '.join(sorted(os.path.basename(p) for p in changed))}")
+            attempt(changed)
+    except KeyboardInterrupt:
+        print()
+        return 0
@@ -0,0 +1,135 @@
+"""
+Persistent render worker for the Module 1 diagram generator
+Reads one JSON render request per line on stdin and writes one JSON result
+per line on stdout, so authoring tools pay interpreter start-up, imports,
+font loading and diagram capture once instead of on every render.
+
+Request:
+    {"id": 7, "diagram": "nucleus-diagram", "width": 480, "format": "webp",
+     "quality": 80, "output": "/tmp/preview.webp"}
+
+Only "diagram" is required. Size is "width", "height" or "scale" (default
+1); "format" is webp, png, jpeg, avif or svg; "lossless" selects lossless
+WebP. With "output" the bytes are written there and the path is returned,
+otherwise they come back base64-encoded as "data".
+
+Result:
+    {"id": 7, "ok": true, "diagram": "nucleus-diagram", "width": 480,
+     "height": 384, "type": "image/webp", "bytes": 5120, "ms": 41.2,
+     "path": "/tmp/preview.webp"}
+
+Failures reply {"id": ..., "ok": false, "error": "..."} and the worker keeps
+serving. The first line written is {"ready": true, "diagrams": [...]}.
+"""
+
+import base64
+import json
+import os
+import time
+
+import layers
+from encoding import MIME_TYPES, encode, write_bytes
+from registry import job_id
+from svg_backend import render_svg
+
+FORMATS = {'webp': 'WEBP', 'png': 'PNG', 'jpeg': 'JPEG', 'jpg': 'JPEG', 'avif': 'AVIF', 'svg': 'SVG'}
+
+class RequestError(ValueError):
+    """Raised for a malformed or unsatisfiable render request"""
+
+class Renderer:
+    """Renders registered diagrams on demand, keeping their display lists warm.
+
+    capture(job, layer_cache) returns a job's display list; captures are
+    reused until one of the job's input files (e.g. its spec) changes on
+    disk. layer_cache is an optional layers.LayerCache for base layers, used
+    by captures and renders alike, so a re-captured spec whose edits are
+    label-only replays just the labels.
+    """
+
+    def __init__(self, jobs, capture, layer_cache=None):
+        self.jobs = {job_id(job): job for job in jobs}
+        self.capture = capture
+        self.layer_cache = layer_cache
+        self._captured = {}
+
+    def display_list(self, job):
+        mtimes = tuple(os.stat(path).st_mtime_ns for path in job.inputs)
+        cached = self._captured.get(job.name)
+        if cached is None or cached[0] != mtimes:
+            cached = self._captured[job.name] = (mtimes, self.capture(job, self.layer_cache))
+        return cached[1]
+
+    def _scale(self, job, request):
+        width, height = job.size
+        if 'width' in request:
+            return float(request['width']) / width
+        if 'height' in request:
+            return float(request['height']) / height
+        return float(request.get('scale', 1))
+
+    def render(self, request):
+        """Render one request and return (bytes, result fields)"""
+        name = request.get('diagram')
+        if name not in self.jobs:
+            raise RequestError(f"unknown diagram: {name!r}")
+        fmt = FORMATS.get(str(request.get('format', 'webp')).lower())
+        if fmt is None:
+            raise RequestError(f"unsupported format: {request.get('format')!r}")
+        job = self.jobs[name]
+        scale = self._scale(job, request)
+        if not 0 < scale <= 8:
+            raise RequestError(f"scale {scale:g} out of range")
+
+        display_list = self.display_list(job)
+        size = (round(job.size[0] * scale), round(job.size[1] * scale))
+        if fmt == 'SVG':
+            data = render_svg(display_list, size).encode('utf-8')
+            return data, {'width': size[0], 'height': size[1]}
+        settings = {'format': fmt}
+        if request.get('lossless') and fmt == 'WEBP':
+            settings['lossless'] = True
+        elif fmt != 'PNG':
+            settings['quality'] = int(request.get('quality', job.encode.get('quality', 85)))
+        img = layers.render(display_list, scale, self.layer_cache)
+        return encode(img, settings), {'width': img.width, 'height': img.height}
+
+    def handle(self, request):
+        """Serve one request, returning the JSON-ready result (never raises for
+        a bad request)"""
+        start = time.perf_counter()
+        result = {'id': request.get('id')} if isinstance(request, dict) else {'id': None}
+        try:
+            if not isinstance(request, dict):
+                raise RequestError('request must be a JSON object')
+            data, fields = self.render(request)
+            fmt = FORMATS[str(request.get('format', 'webp')).lower()]
+            result.update(ok=True, diagram=request['diagram'], type=MIME_TYPES[fmt],
+                          bytes=len(data), **fields)
+            if request.get('output'):
+                write_bytes(os.path.abspath(request['output']), data)
+                result['path'] = os.path.abspath(request['output'])
+            else:
+                result['data'] = base64.b64encode(data).decode('ascii')
+        except Exception as e:
+            result.update(ok=False, error=f"{type(e).__name__}: {e}")
+        result['ms'] = round((time.perf_counter() - start) * 1000, 1)
+        return result
+
+def serve(renderer, infile, outfile):
+    """Answer JSON-lines requests from infile until EOF"""
+    def send(message):
+        outfile.write(json.dumps(message) + '\n')
+        outfile.flush()
+
+    send({'ready': True, 'diagrams': sorted(renderer.jobs)})
+    for line in infile:
+        if not line.strip():
+            continue
+        try:
+            request = json.loads(line)
+        except ValueError as e:
+            send({'id': None, 'ok': False, 'error': f"invalid JSON: {e}"})
+            continue
+        send(renderer.handle(request))
+    return 0
@@ -480,17 +480,22 @@ const ImageManager = {
     
     // Build srcset if we have multiple versions
     let srcset = '';
-    if (image.srcWebp) {
+    let sources = '';
+    if (image.variants && image.variants.length) {
+      sources = this.createSourcesHTML(image, sizes);
+    } else if (image.srcWebp) {
       srcset = `${image.srcWebp} 1x`;
+      sources = `<source srcset="${image.srcWebp}" type="image/webp">`;
     }
     
-    // Placeholder with dominant color
+    // Placeholder with dominant color, under the blurred preview if there is one
     const placeholder = image.dominantColor || '#e2e8f0';
+    const preview = image.placeholder ? ` url('${image.placeholder}') center/cover no-repeat` : '';
     
     return `
       <figure class="lesson-image${className ? ' ' + className : ''}"${style}>
         <picture>
-          ${image.srcWebp ? `<source srcset="${image.srcWebp}" type="image/webp">` : ''}
+          ${sources}
           <img 
             src="${image.thumbnail || image.src}" 
             data-src="${image.src}"
@@ -498,7 +503,7 @@ const ImageManager = {
             loading="${loading}"
             width="${image.width}"
             height="${image.height}"
-            style="background-color: ${placeholder};"
+            style="background: ${placeholder}${preview};"
             ${srcset ? `srcset="${srcset}"` : ''}
             ${sizes ? `sizes="${sizes}"` : ''}
             onload="this.classList.add('loaded')"
@@ -510,6 +515,60 @@ const ImageManager = {
     `;
   },
   
+  /**
+   * Create <source> elements for an image's generator variants: one per
+   * format, widths as w descriptors; theme variants come first so their
+   * media queries win when they match
+   * @param {Object} image - Image object from fromSidecar
+   * @param {string} sizes
+   * @returns {string}
+   */
+  createSourcesHTML(image, sizes = '(max-width: 768px) 100vw, 800px') {
+    const sourcesFor = (variants, media) => {
+      const byType = {};
+      variants.forEach(v => {
+        (byType[v.type] = byType[v.type] || []).push(`${v.src} ${v.width}w`);
+      });
+      const mediaAttr = media ? ` media="${media}"` : '';
+      return Object.entries(byType)
+        .map(([type, entries]) => `<source${mediaAttr} srcset="${entries.join(', ')}" type="${type}" sizes="${sizes}">`)
+        .join('');
+    };
+    return (image.themes || []).map(theme => sourcesFor(theme.variants, theme.media)).join('')
+      + sourcesFor(image.variants);
+  },
+  
+  /**
+   * Build an image object from a generator sidecar entry (images.json)
+   * @param {string} name - Image name, the sidecar key
+   * @param {Object} entry - Sidecar entry with variants, thumbnail and optional themes
+   * @param {string} baseUrl - URL of the directory holding images.json
+   * @returns {Object}
+   */
+  fromSidecar(name, entry, baseUrl) {
+    const base = baseUrl.endsWith('/') ? baseUrl : baseUrl + '/';
+    const variants = entry.variants.map(v => ({ ...v, src: base + v.src }));
+    const primary = variants.find(v => v.density === 1) || variants[0];
+    const themes = Object.entries(entry.themes || {}).map(([name, theme]) => ({
+      name,
+      media: theme.media,
+      variants: theme.variants.map(v => ({ ...v, src: base + v.src }))
+    }));
+    return {
+      id: name,
+      src: primary.src,
+      thumbnail: entry.thumbnail ? base + entry.thumbnail.src : null,
+      width: entry.width,
+      height: entry.height,
+      size: primary.bytes,
+      mimeType: primary.type,
+      dominantColor: entry.color,
+      placeholder: entry.placeholder,
+      variants,
+      themes
+    };
+  },
+  
   /**
    * Escape HTML entities
    * @param {string} text 
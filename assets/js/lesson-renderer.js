@@ -10,6 +10,9 @@ class LessonRenderer {
     this.container = document.getElementById(containerId);
     this.lesson = null;
     this.currentActivity = null;
+    this.imageMeta = new Map();
+    this.sidecars = new Map();
+    this.sidecarImages = new Map();
   }
 
   /**
@@ -36,6 +39,83 @@ class LessonRenderer {
     }
   }
 
+  /**
+   * Load generator sidecars (images.json) for the lesson's images so their
+   * placeholder and dominant colour can be painted before they download,
+   * and, with ImageManager loaded, their other variants offered as sources.
+   * Each images.json is fetched once per renderer. Images without a sidecar
+   * simply render without one.
+   */
+  async loadImageMeta() {
+    const sources = new Set();
+    const collect = (node) => {
+      if (!node || typeof node !== 'object') return;
+      if (node.image && typeof node.image.src === 'string') sources.add(node.image.src);
+      Object.values(node).forEach(collect);
+    };
+    collect(this.lesson);
+
+    await Promise.all([...sources].map(async (src) => {
+      const url = new URL(src, document.baseURI);
+      const dir = url.href.slice(0, url.href.lastIndexOf('/') + 1);
+      const name = url.pathname.split('/').pop().replace(/\.[^.]+$/, '');
+      if (!this.sidecars.has(dir)) {
+        this.sidecars.set(dir, fetch(dir + 'images.json')
+          .then(res => (res.ok ? res.json() : {}))
+          .catch(() => ({})));
+      }
+      const entry = (await this.sidecars.get(dir))[name];
+      if (!entry) return;
+      this.imageMeta.set(src, entry);
+      if (typeof ImageManager !== 'undefined') {
+        this.sidecarImages.set(src, ImageManager.fromSidecar(name, entry, dir));
+      }
+    }));
+  }
+
+  /**
+   * Apply sidecar metadata to images already rendered before it arrived:
+   * width/height and variant sources always, the placeholder only while
+   * the image is loading
+   */
+  applyImageMeta() {
+    if (!this.container) return;
+    this.container.querySelectorAll('img[src]').forEach(img => {
+      const src = img.getAttribute('src');
+      const meta = this.imageMeta.get(src);
+      if (!meta) return;
+      if (!img.hasAttribute('width')) img.setAttribute('width', meta.width);
+      if (!img.hasAttribute('height')) img.setAttribute('height', meta.height);
+      if (this.sidecarImages.has(src)) this.addImageSources(img, this.sidecarImages.get(src));
+      if (img.complete && img.naturalWidth) return;
+      img.style.background = this.placeholderBackground(meta);
+    });
+  }
+
+  /**
+   * Wrap a rendered image in a <picture> offering its sidecar variants
+   * (@2x, other formats, themes) built by ImageManager.createSourcesHTML
+   */
+  addImageSources(img, image) {
+    if (img.closest('picture')) return;
+    const picture = document.createElement('picture');
+    // The wrapper must not change the image's layout
+    picture.style.display = 'contents';
+    picture.innerHTML = ImageManager.createSourcesHTML(image);
+    img.replaceWith(picture);
+    picture.appendChild(img);
+  }
+
+  /**
+   * CSS background for an image's sidecar placeholder: the blurred preview
+   * over the dominant colour, shown until the image paints over it
+   */
+  placeholderBackground(meta) {
+    return meta.placeholder
+      ? `${meta.color || 'transparent'} url('${meta.placeholder}') center/cover no-repeat`
+      : meta.color;
+  }
+
   /**
    * Detect V2 format lessons
    * Supports: v2: true, version: 2, or contentHTML fallback
@@ -72,9 +152,17 @@ class LessonRenderer {
     if (this.isV2Format()) {
       this.loadV2Styles();
       this.renderV2();
-      return;
+    } else {
+      this.renderV1();
     }
+    // Sidecars only refine the images, so they never hold up the lesson
+    this.loadImageMeta().then(() => this.applyImageMeta());
+  }
 
+  /**
+   * V1 Format: Render the complete lesson
+   */
+  renderV1() {
     const html = `
       ${this.renderHero()}
       ${this.renderLearningIntentions()}
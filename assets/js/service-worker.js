@@ -6,6 +6,14 @@
 
 const CACHE_NAME = 'science-hub-v2';
 
+// Lesson images live in their own cache, reconciled against the hashed
+// manifest written by assets/images/mod1/create_images.py, so a version bump
+// above does not throw away (and refetch) diagrams that have not changed
+const IMAGE_CACHE_NAME = 'science-hub-images';
+const IMAGE_MANIFEST_URL = '../images/mod1/image-manifest.json';
+const MANIFEST_REFRESH_MS = 60 * 60 * 1000;
+let lastManifestRefresh = 0;
+
 // Assets to cache on install (critical assets only)
 // Use relative paths to work on GitHub Pages subdirectory deployments
 // Service worker is at /assets/js/, so paths are relative to that
@@ -24,14 +32,14 @@ self.addEventListener('install', (event) => {
   // Skip waiting to activate immediately
   self.skipWaiting();
   
-  // Precache critical assets
+  // Precache critical assets, then any lesson images that changed
   event.waitUntil(
     caches.open(CACHE_NAME).then((cache) => {
       console.log('[SW] Precaching assets');
       return cache.addAll(PRECACHE_ASSETS);
     }).catch((err) => {
       console.error('[SW] Precache failed:', err);
-    })
+    }).then(() => syncImageCache())
   );
 });
 
@@ -47,7 +55,7 @@ self.addEventListener('activate', (event) => {
     caches.keys().then((cacheNames) => {
       return Promise.all(
         cacheNames.map((cacheName) => {
-          if (cacheName !== CACHE_NAME) {
+          if (cacheName !== CACHE_NAME && cacheName !== IMAGE_CACHE_NAME) {
             console.log('[SW] Deleting old cache:', cacheName);
             return caches.delete(cacheName);
           }
@@ -78,8 +86,16 @@ self.addEventListener('fetch', (event) => {
     return;
   }
 
+  // Pick up new diagram hashes now and then while pages are being visited
+  if (request.mode === 'navigate' && Date.now() - lastManifestRefresh > MANIFEST_REFRESH_MS) {
+    event.waitUntil(syncImageCache());
+  }
+
   // Handle different resource types
-  if (isCriticalAsset(request)) {
+  if (isImage(request)) {
+    // Manifest-tracked images are current in the image cache
+    event.respondWith(imageCacheFirst(request));
+  } else if (isCriticalAsset(request)) {
     // Network-first for CSS/JS (always get fresh code to avoid caching bugs)
     event.respondWith(networkFirst(request));
   } else if (isAsset(request)) {
@@ -115,6 +131,16 @@ async function staleWhileRevalidate(request) {
   return cached || fetchPromise;
 }
 
+/**
+ * Image cache first, falling back to stale-while-revalidate for images the
+ * manifest does not track
+ */
+async function imageCacheFirst(request) {
+  const imageCache = await caches.open(IMAGE_CACHE_NAME);
+  const cached = await imageCache.match(request);
+  return cached || staleWhileRevalidate(request);
+}
+
 /**
  * Network-first strategy
  * Try network first, fallback to cache
@@ -196,10 +222,77 @@ async function networkFirst(request) {
   }
 }
 
+// ========================================
+// IMAGE MANIFEST
+// ========================================
+
+/**
+ * Bring the image cache in line with the hashed image manifest: fetch only
+ * precache entries whose content hash changed (or that are missing), and
+ * drop entries the manifest no longer lists
+ */
+async function syncImageCache() {
+  lastManifestRefresh = Date.now();
+  const manifestUrl = new URL(IMAGE_MANIFEST_URL, self.location).href;
+
+  try {
+    const response = await fetch(manifestUrl, { cache: 'no-cache' });
+    if (!response.ok) {
+      return;
+    }
+    const manifest = await response.clone().json();
+    const imageCache = await caches.open(IMAGE_CACHE_NAME);
+
+    const previousResponse = await imageCache.match(manifestUrl);
+    const previous = previousResponse ? await previousResponse.json() : { precache: [] };
+    const previousHashes = new Map(
+      previous.precache.map((item) => [new URL(item.url, manifestUrl).href, item.hash])
+    );
+
+    const current = new Set();
+    const changed = [];
+    for (const item of manifest.precache) {
+      const url = new URL(item.url, manifestUrl).href;
+      current.add(url);
+      if (previousHashes.get(url) !== item.hash || !(await imageCache.match(url))) {
+        changed.push(url);
+      }
+    }
+
+    const results = await Promise.allSettled(
+      changed.map((url) => fetch(url, { cache: 'reload' }).then((res) => {
+        if (!res.ok) {
+          throw new Error(`${res.status} ${url}`);
+        }
+        return imageCache.put(url, res);
+      }))
+    );
+    const removed = [...previousHashes.keys()].filter((url) => !current.has(url));
+    await Promise.all(removed.map((url) => imageCache.delete(url)));
+
+    // Only remember the new manifest once every changed image is stored
+    if (results.every((result) => result.status === 'fulfilled')) {
+      await imageCache.put(manifestUrl, response);
+    }
+    console.log(`[SW] Images: ${changed.length} updated, ${removed.length} removed`);
+  } catch (err) {
+    console.error('[SW] Image manifest sync failed:', err);
+  }
+}
+
 // ========================================
 // HELPERS
 // ========================================
 
+/**
+ * Check if request is for a lesson image
+ */
+function isImage(request) {
+  const imageExtensions = ['.webp', '.avif', '.png', '.jpg', '.jpeg', '.gif', '.svg'];
+  const url = new URL(request.url);
+  return imageExtensions.some(ext => url.pathname.endsWith(ext));
+}
+
 /**
  * Check if request is for a critical asset (CSS, JS) that should always be fresh
  */
@@ -213,7 +306,7 @@ function isCriticalAsset(request) {
  * Check if request is for an asset (CSS, JS, images, fonts)
  */
 function isAsset(request) {
-  const assetExtensions = ['.css', '.js', '.png', '.jpg', '.jpeg', '.gif', '.svg', '.woff', '.woff2', '.ttf'];
+  const assetExtensions = ['.css', '.js', '.png', '.jpg', '.jpeg', '.gif', '.svg', '.webp', '.avif', '.woff', '.woff2', '.ttf'];
   const url = new URL(request.url);
   return assetExtensions.some(ext => url.pathname.endsWith(ext));
 }